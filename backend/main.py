@@ -1,19 +1,20 @@
+# CRITICAL: Load .env FIRST before ANY other imports
+# Services create singleton instances on import and need API keys immediately
 from dotenv import load_dotenv
 load_dotenv()
 
 from services.trend_analysis import trend_service
 from services.user_data import user_service
+from prompts.image_generation import image_service
 from routers import trends, users
+from middleware.timing import TimingASGIMiddleware
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+import anyio.to_thread
 import logging
-
-
-# CRITICAL: Load .env FIRST before ANY other imports
-# Services create singleton instances on import and need API keys immediately
-
-# Now safe to import everything else
+import os
 
 
 # Logging konfigurieren
@@ -30,24 +31,33 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starte Dynamic Ads Content API...")
 
+    # Thread-Pool für blockierende Aufrufe (to_thread, Sync-Endpunkte)
+    # vergrößern; AnyIO begrenzt standardmäßig auf 40 Threads.
+    # Höhere Werte helfen bei I/O, nicht bei CPU-lastiger Arbeit.
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = int(os.getenv("ANYIO_THREADS", "100"))
+
     # Lade User-Daten
     logger.info("Lade User-Daten...")
     user_service.load_users()
 
-    # Initialisiere Trendanalyse
-    logger.info("Initialisiere Trendanalyse...")
-    await trend_service.fetch_user_interests()
-    logger.info("Trendanalyse erfolgreich initialisiert")
+    # Initialisiere Trendanalyse im Hintergrund, damit der Server sofort
+    # Anfragen annimmt; Endpunkte warten nur, solange noch keine Daten da sind
+    logger.info("Initialisiere Trendanalyse im Hintergrund...")
+    trend_service.start_background_refresh()
 
     yield
 
     # Shutdown
     logger.info("Beende Dynamic Ads Content API...")
+    await trend_service.stop_background_refresh()
+    await image_service.aclose()
 
 
 app = FastAPI(
     title="Dynamic Ads Content API",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS-Konfiguration für Frontend
@@ -59,6 +69,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request-Timing als reine ASGI-Middleware. Keine @app.middleware("http")-Hooks
+# hinzufügen (BaseHTTPMiddleware kostet deutlich Durchsatz), sondern Klassen
+# mit async def __call__(self, scope, receive, send) wie in middleware/timing.py
+app.add_middleware(TimingASGIMiddleware)
+
 # Router einbinden
 app.include_router(trends.router, prefix="/api/v1", tags=["trends"])
 app.include_router(users.router, prefix="/api/v1", tags=["users"])
@@ -76,4 +91,18 @@ async def health_check():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # uvicorn[standard] bringt uvloop und httptools mit, "auto" wählt sie.
+    # Standardmäßig 1 Worker: Trends, Matches und Bilder liegen im
+    # Prozessspeicher und wären bei mehreren Workern nicht geteilt.
+    workers = int(os.getenv("UVICORN_WORKERS", "1"))
+    # Mit einem Worker das App-Objekt direkt übergeben, sonst würde "main:app"
+    # dieses Modul ein zweites Mal importieren (App und Singletons doppelt).
+    # Mehrere Worker brauchen den Import-String.
+    uvicorn.run(
+        "main:app" if workers > 1 else app,
+        host="0.0.0.0",
+        port=8000,
+        loop="auto",
+        http="auto",
+        workers=workers
+    )
\ No newline at end of file
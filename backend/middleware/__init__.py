@@ -0,0 +1 @@
+# Backend ASGI Middleware
@@ -0,0 +1,35 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TimingASGIMiddleware:
+    """
+    Reine ASGI-Middleware: misst die Bearbeitungszeit pro HTTP-Request und
+    setzt den Header X-Process-Time. Im Gegensatz zu @app.middleware("http")
+    (BaseHTTPMiddleware) wird der Response-Stream nicht zusätzlich gepuffert.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                duration_ms = (time.perf_counter() - start) * 1000
+                headers = list(message.get("headers", []))
+                headers.append(
+                    (b"x-process-time", f"{duration_ms:.1f}ms".encode()))
+                message["headers"] = headers
+                logger.debug("%s %s - %.1fms",
+                             scope["method"], scope["path"], duration_ms)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,18 +1,94 @@
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, Optional, Tuple, Union
+from collections import defaultdict, deque
+import asyncio
+import hashlib
 import logging
 import os
+import random
+import time
 import httpx
-import json
+import orjson
+from prompts.lru_cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+# Polling of BFL tasks: exponential backoff with jitter within a total budget
+POLL_INITIAL = 0.3
+POLL_MAX = 3.0
+POLL_MULT = 1.25
+POLL_TOTAL = 60.0
+# Completion-time history per endpoint/size: once POLL_HISTORY_MIN samples
+# exist, the first poll is placed at POLL_HISTORY_QUANTILE of that history
+POLL_HISTORY_SIZE = 128
+POLL_HISTORY_MIN = 16
+POLL_HISTORY_QUANTILE = 0.1
+# Upper bound for one generation including submit retries and polling
+GENERATION_BUDGET = 90.0
+
+# Values of "status" in generation results
+STATUS_GENERATED = "generated"
+STATUS_FAILED = "failed"
+STATUS_MODERATED = "moderated"
+STATUS_TIMEOUT = "timeout"
+STATUS_ERROR = "error"
+STATUS_NO_KEY = "no_key"
+# Normalized BFL task states (lowercase, spaces -> underscores)
+_TERMINAL_STATUSES = frozenset(
+    {"error", "failed", "request_moderated", "content_moderated"})
+_NOT_FOUND_STATUS = "task_not_found"
+
+# BFL result URLs are signed and expire, so cached results must not outlive them
+PROMPT_CACHE_TTL = 600.0
+
+# Style/context fields of a structured prompt, in prompt order, with defaults
+_PROMPT_DEFAULTS = {
+    'style': 'professional photography',
+    'scene': 'studio setup',
+    'background': 'clean backdrop',
+    'lighting': 'professional lighting',
+    'mood': 'clean and professional',
+}
+_DEFAULT_SUBJECT = ("product", "displayed prominently")
+_DEFAULT_CAMERA = {'angle': 'medium angle', 'focus': 'sharp focus'}
+
 
 class ImageGenerationService:
     """Service for image generation with Black Forest Labs and other APIs"""
 
+    # Black Forest Labs endpoints
+    _BFL_TEXT_TO_IMAGE_URL = "https://api.bfl.ml/v1/flux-pro-1.1"
+    _BFL_IMAGE_EDIT_URL = "https://api.bfl.ai/v1/flux-2-pro"
+    _BFL_RESULT_URL = "https://api.bfl.ai/v1/get_result?id="
+    # Short per-request timeouts; hung requests fail fast instead of
+    # holding a concurrency slot for a full minute
+    _BFL_TIMEOUT = httpx.Timeout(connect=3.0, read=20.0, write=10.0, pool=5.0)
+    _SUBMIT_ATTEMPTS = 4
+    _SUBMIT_BACKOFF_BASE = 0.5
+    _SUBMIT_BACKOFF_CAP = 8.0
+    _RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+    # Submits are billed and not idempotent: only retry errors where the
+    # request certainly never reached BFL (no read/write timeouts)
+    _RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
     def __init__(self):
         self.black_forest_api_key = os.getenv("BLACK_FOREST_API_KEY")
-        self.generated_images: Dict[int, Dict[str, Any]] = {}
+        # Bounded so long-running servers don't grow these caches forever
+        cache_size = int(os.getenv("IMG_CACHE_MAX", "2048"))
+        self.generated_images: LRUCache = LRUCache(cache_size)
+        self.trend_images: LRUCache = LRUCache(cache_size)
+        # Shared HTTP client, reused for all BFL requests (created lazily)
+        self._client: Optional[httpx.AsyncClient] = None
+        # (expires_at, result) by prompt hash, so identical prompts trigger
+        # only one BFL call
+        self._prompt_cache: LRUCache = LRUCache(maxsize=1024)
+        # Running generations by cache key; identical concurrent requests join them
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Observed completion times (s) by endpoint and image size
+        self._completion_times: Dict[str, deque] = defaultdict(
+            lambda: deque(maxlen=POLL_HISTORY_SIZE))
+        # Limits concurrent BFL generations during fan-out (rate limits)
+        self.max_concurrency = int(os.getenv("BFL_MAX_CONCURRENCY", "8"))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
 
         if self.black_forest_api_key:
             logger.info("Black Forest API Key found")
@@ -20,6 +96,340 @@ class ImageGenerationService:
             logger.warning(
                 "BLACK_FOREST_API_KEY not set - Image Generation disabled")
 
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Returns the shared HTTP client for Black Forest Labs requests.
+        Keeping one pooled client avoids a new TCP/TLS handshake per image
+        and per polling request.
+        """
+        if self._client is None or self._client.is_closed:
+            headers = {"Content-Type": "application/json"}
+            if self.black_forest_api_key:
+                headers["X-Key"] = self.black_forest_api_key
+            self._client = httpx.AsyncClient(
+                http2=True,
+                timeout=self._BFL_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=64, max_keepalive_connections=32),
+                headers=headers
+            )
+        return self._client
+
+    async def aclose(self):
+        """Closes the shared HTTP client (called on app shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def _prompt_cache_key(
+        kind: str,
+        prompt_str: str,
+        width: int,
+        height: int,
+        reference_image_url: Optional[str] = None
+    ) -> str:
+        """Content-addressed cache key for a generation request"""
+        ref_hash = hashlib.sha256(
+            reference_image_url.encode()).hexdigest() if reference_image_url else ""
+        key = f"{kind}|{prompt_str}|{width}x{height}|{ref_hash}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _get_cached_result(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Returns a cached generation result unless it has expired"""
+        entry = self._prompt_cache.get(cache_key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if time.monotonic() >= expires_at:
+            del self._prompt_cache[cache_key]
+            return None
+        return result
+
+    def _cache_result(self, cache_key: str, result: Dict[str, Any]):
+        """Caches a successful generation result for PROMPT_CACHE_TTL seconds"""
+        self._prompt_cache[cache_key] = (
+            time.monotonic() + PROMPT_CACHE_TTL, result)
+
+    async def _bounded(self, coro):
+        """Runs a generation coroutine under the shared concurrency limit"""
+        async with self._semaphore:
+            return await coro
+
+    def _request_timeout(self, deadline: float) -> httpx.Timeout:
+        """_BFL_TIMEOUT, capped at the time left until the generation deadline"""
+        remaining = max(deadline - asyncio.get_running_loop().time(), 0.001)
+        timeout = self._BFL_TIMEOUT
+        return httpx.Timeout(
+            connect=min(timeout.connect, remaining),
+            read=min(timeout.read, remaining),
+            write=min(timeout.write, remaining),
+            pool=min(timeout.pool, remaining))
+
+    async def _submit(
+        self,
+        endpoint: str,
+        payload: Dict[str, Any],
+        label: str,
+        deadline: float
+    ) -> Dict[str, Any]:
+        """
+        Submits a generation request to BFL and returns the parsed response.
+        Connection errors, 429 and 5xx are retried with full-jitter backoff
+        as long as the retry still starts before the deadline.
+        """
+        client = self._get_client()
+        loop = asyncio.get_running_loop()
+        # Serialize once with orjson (payload may hold a multi-MB base64
+        # image) and reuse the bytes across retries; Content-Type is a
+        # default header of the shared client
+        body = orjson.dumps(payload)
+        for attempt in range(self._SUBMIT_ATTEMPTS):
+            last_attempt = attempt == self._SUBMIT_ATTEMPTS - 1
+            try:
+                response = await client.post(
+                    endpoint, content=body, timeout=self._request_timeout(deadline))
+            except self._RETRYABLE_ERRORS as e:
+                error = e
+                reason = type(e).__name__
+                retry_after = None
+            else:
+                error = None
+                if response.status_code not in self._RETRYABLE_STATUS:
+                    break
+                reason = f"Status {response.status_code}"
+                retry_after = self._retry_hint({}, response)
+
+            backoff = min(self._SUBMIT_BACKOFF_CAP,
+                          self._SUBMIT_BACKOFF_BASE * 2 ** attempt)
+            delay = min(retry_after, self._SUBMIT_BACKOFF_CAP) \
+                if retry_after is not None else random.uniform(0, backoff)
+            # Out of attempts or budget: give up with the last error/response
+            if last_attempt or loop.time() + delay >= deadline:
+                if error is not None:
+                    raise error
+                break
+            logger.warning(
+                f"Black Forest submit for {label} failed ({reason}), retrying in {delay:.2f}s...")
+            await asyncio.sleep(delay)
+
+        try:
+            result = orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            result = {"detail": response.text[:200]}
+        # Log only status, not full response with base64 data
+        if response.status_code != 200:
+            logger.error(
+                f"Black Forest API Error for {label}: Status {response.status_code}")
+            if "detail" in result:
+                logger.error(f"Error details: {result['detail']}")
+        else:
+            logger.info(
+                f"Black Forest Response for {label}: Status {response.status_code} - Success")
+        return result
+
+    @staticmethod
+    def _retry_hint(status: Dict[str, Any], response: httpx.Response) -> Optional[float]:
+        """Reads an ETA/Retry-After hint (seconds) from a polling response"""
+        hint = status.get("eta") or status.get(
+            "retry_after") or response.headers.get("Retry-After")
+        try:
+            return float(hint) if hint is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    def _initial_poll_delay(self, history_key: str) -> float:
+        """
+        Delay before the first poll: POLL_INITIAL until enough completions
+        were observed, then a low quantile of the estimated completion times,
+        so jobs that can't be ready yet are not polled
+        """
+        samples = self._completion_times.get(history_key)
+        if not samples or len(samples) < POLL_HISTORY_MIN:
+            return POLL_INITIAL
+        ordered = sorted(samples)
+        quantile = ordered[int(len(ordered) * POLL_HISTORY_QUANTILE)]
+        return min(max(quantile, POLL_INITIAL), POLL_TOTAL / 2)
+
+    async def _poll(
+        self,
+        polling_url: str,
+        label: str,
+        history_key: str,
+        deadline: float
+    ) -> Tuple[Optional[str], str]:
+        """
+        Polls a BFL task until it is ready, failed or POLL_TOTAL (at most
+        until the generation deadline) has passed.
+        The first delay comes from the completion history, then grows up to
+        POLL_MAX unless the response carries an ETA/Retry-After hint; jitter
+        keeps parallel tasks from polling in lockstep.
+
+        Returns:
+            Tuple of image URL (or None) and result status
+        """
+        client = self._get_client()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = min(start + POLL_TOTAL, deadline)
+        delay = self._initial_poll_delay(history_key)
+        next_progress_log = 20
+        first_poll = True
+        # Elapsed time of the last poll that was not ready yet; the job
+        # finished somewhere between it and the ready poll
+        last_pending = 0.0
+        status: Dict[str, Any] = {}
+
+        while loop.time() < deadline:
+            await asyncio.sleep(min(delay + random.uniform(0, delay * 0.2),
+                                    deadline - loop.time()))
+            if loop.time() >= deadline:
+                break
+            delay = min(delay * POLL_MULT, POLL_MAX)
+            try:
+                status_resp = await client.get(
+                    polling_url, timeout=self._request_timeout(deadline))
+            except httpx.TransportError as e:
+                # Polling is idempotent - just try again on the next round
+                logger.warning(
+                    f"{label}: Polling request failed ({type(e).__name__}), retrying...")
+                continue
+            status = orjson.loads(status_resp.content)
+            elapsed = loop.time() - start
+
+            hint = self._retry_hint(status, status_resp)
+            if hint is not None:
+                delay = min(max(hint, POLL_INITIAL), POLL_MAX)
+
+            # DEBUG: Log full status on first poll (lazy %-formatting: the
+            # status dict is only rendered if INFO is actually enabled)
+            if first_poll:
+                logger.info("%s: Polling status at %.1fs: %s",
+                            label, elapsed, status)
+                first_poll = False
+
+            # Check status (case-insensitive, "Request Moderated" -> "request_moderated")
+            current_status = str(status.get("status") or "").lower().replace(" ", "_")
+
+            if current_status == "ready":
+                logger.info("✅ %s: Image ready after %.1f seconds",
+                            label, elapsed)
+                # Record the middle of that interval, not the ready poll
+                # itself: the poll time is only an upper bound, and
+                # recording it would let the first-poll estimate only rise
+                self._completion_times[history_key].append(
+                    (last_pending + elapsed) / 2)
+                return status.get("result", {}).get("sample"), STATUS_GENERATED
+            elif current_status in _TERMINAL_STATUSES:
+                logger.error(
+                    "❌ %s: Generation failed with status '%s' - %s", label, current_status, status)
+                return None, STATUS_MODERATED if current_status.endswith("_moderated") else STATUS_FAILED
+            elif current_status == _NOT_FOUND_STATUS or (
+                    not current_status and "not found" in str(status.get("detail") or "").lower()):
+                logger.error(
+                    "❌ %s: Task not found - API returned: %s", label, status)
+                return None, STATUS_FAILED
+            last_pending = elapsed
+            # Log progress every 20 seconds
+            if elapsed >= next_progress_log:
+                logger.info("⏳ %s: Still processing (status: %s)... (%.0fs elapsed)",
+                            label, current_status, elapsed)
+                next_progress_log += 20
+
+        logger.warning(
+            f"⚠️ {label}: Polling timeout after {loop.time() - start:.0f} seconds - Last status: {status.get('status', 'unknown')}")
+        return None, STATUS_TIMEOUT
+
+    async def _generate(
+        self,
+        endpoint: str,
+        payload: Dict[str, Any],
+        label: str
+    ) -> Tuple[Optional[str], str]:
+        """
+        Submits a request and polls its task within GENERATION_BUDGET, so a
+        stuck generation cannot hold a concurrency slot indefinitely. Every
+        request gets a timeout derived from the remaining budget and no
+        retry starts after it is spent.
+
+        Returns:
+            Tuple of image URL (or None) and result status
+        """
+        deadline = asyncio.get_running_loop().time() + GENERATION_BUDGET
+        try:
+            return await self._submit_and_poll(endpoint, payload, label, deadline)
+        except httpx.TimeoutException as e:
+            logger.warning(
+                f"⚠️ {label}: Black Forest request timed out ({type(e).__name__})")
+            return None, STATUS_TIMEOUT
+
+    async def _submit_and_poll(
+        self,
+        endpoint: str,
+        payload: Dict[str, Any],
+        label: str,
+        deadline: float
+    ) -> Tuple[Optional[str], str]:
+        """Submits a request and polls its task; returns (image URL or None, status)"""
+        result = await self._submit(endpoint, payload, label, deadline)
+
+        if "result" in result and result["result"]:
+            # Immediate result (rare for FLUX.2)
+            return result["result"].get("sample"), STATUS_GENERATED
+        if "id" in result:
+            # Async generation - need to poll
+            task_id = result["id"]
+            # Use polling_url from response or construct with correct domain
+            polling_url = result.get(
+                "polling_url", f"{self._BFL_RESULT_URL}{task_id}")
+            logger.info(
+                f"Polling task {task_id} for {label} (max {POLL_TOTAL:.0f}s)...")
+            history_key = f"{endpoint}|{payload.get('width')}x{payload.get('height')}"
+            return await self._poll(polling_url, label, history_key, deadline)
+        return None, STATUS_FAILED
+
+    async def _generate_coalesced(
+        self,
+        cache_key: str,
+        endpoint: str,
+        payload: Dict[str, Any],
+        label: str,
+        result: Dict[str, Any]
+    ) -> Tuple[Optional[str], str]:
+        """
+        Like _generate, but concurrent requests with the same cache key share
+        a single BFL job instead of each submitting their own. A successful
+        job caches result (completed with image_url and status) itself.
+        """
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._generate_and_cache(cache_key, endpoint, payload, label, result))
+            self._inflight[cache_key] = task
+            task.add_done_callback(
+                lambda _: self._inflight.pop(cache_key, None))
+        else:
+            logger.info(f"Joining in-flight generation for {label}")
+        # shield: a cancelled caller must not cancel the shared job
+        return await asyncio.shield(task)
+
+    async def _generate_and_cache(
+        self,
+        cache_key: str,
+        endpoint: str,
+        payload: Dict[str, Any],
+        label: str,
+        result: Dict[str, Any]
+    ) -> Tuple[Optional[str], str]:
+        """Runs _generate and caches a successful result before the job completes"""
+        image_url, status = await self._generate(endpoint, payload, label)
+        if status == STATUS_GENERATED:
+            # Cached while the job is still in _inflight, so a request that
+            # arrives after it has been removed finds the cached result
+            self._cache_result(
+                cache_key, {**result, "image_url": image_url, "status": status})
+        return image_url, status
+
     async def generate_image_with_black_forest(
         self,
         prompt: Union[str, Dict[str, Any]],
@@ -27,7 +437,7 @@ class ImageGenerationService:
         product_name: str = "product",
         width: int = 1024,
         height: int = 768
-    ) -> Optional[Dict[str, Any]]:
+    ) -> Dict[str, Any]:
         """
         Generates an image using Black Forest Labs Flux.2 API
 
@@ -39,12 +449,18 @@ class ImageGenerationService:
             height: Image height
 
         Returns:
-            Dictionary with image_url and metadata
+            Dictionary with image_url, status and metadata (status "no_key"
+            if generation was skipped because no API key is set)
         """
         if not self.black_forest_api_key:
             logger.warning(
                 "Black Forest API Key missing - Image generation skipped")
-            return None
+            return {
+                "user_id": user_id,
+                "product_name": product_name,
+                "image_url": None,
+                "status": STATUS_NO_KEY
+            }
 
         try:
             # Convert structured prompt to string if needed
@@ -55,145 +471,90 @@ class ImageGenerationService:
                 prompt_str = prompt
                 logger.info(f"Using simple text prompt for user {user_id}")
 
+            cache_key = self._prompt_cache_key(
+                "user", prompt_str, width, height)
+            cached = self._get_cached_result(cache_key)
+            if cached:
+                logger.info(f"Prompt cache hit for user {user_id}")
+                result = {**cached, "user_id": user_id,
+                          "product_name": product_name}
+                self.generated_images[user_id] = result
+                return result
+
             logger.info(
                 f"Generating image with Black Forest for User {user_id}")
             logger.info(f"Prompt preview: {prompt_str[:150]}...")
 
-            # Real Black Forest Labs API Integration
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.bfl.ml/v1/flux-pro-1.1",
-                    headers={
-                        "X-Key": self.black_forest_api_key,
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "prompt": prompt_str,
-                        "width": width,
-                        "height": height,
-                        "prompt_upsampling": False,
-                        "safety_tolerance": 2
-                    },
-                    timeout=60.0
-                )
-                result = response.json()
-                logger.info(
-                    f"Black Forest Response for user {user_id}: {result}")
-
-                # Parse response
-                if "result" in result and result["result"]:
-                    # Immediate result
-                    image_url = result["result"].get("sample")
-                elif "id" in result:
-                    # Async generation - need to poll
-                    task_id = result["id"]
-                    polling_url = result.get(
-                        "polling_url", f"https://api.bfl.ai/v1/get_result?id={task_id}")
-                    logger.info(
-                        f"Polling task {task_id} for user {user_id} (max 60s)...")
-                    import asyncio
-                    for attempt in range(60):  # 60 seconds max
-                        await asyncio.sleep(1)
-                        status_resp = await client.get(
-                            polling_url,
-                            headers={"X-Key": self.black_forest_api_key}
-                        )
-                        status = status_resp.json()
-
-                        # DEBUG: Log full status on first attempt and every 20 seconds
-                        if attempt == 0 or (attempt + 1) % 20 == 0:
-                            logger.info(
-                                f"User {user_id}: Polling status at {attempt + 1}s: {status}")
-
-                        # Check status (case-insensitive)
-                        current_status = str(status.get("status", "")).lower()
-
-                        if current_status == "ready":
-                            image_url = status.get("result", {}).get("sample")
-                            logger.info(
-                                f"✅ User {user_id}: Image ready after {attempt + 1} seconds")
-                            break
-                        elif current_status in ["error", "failed", "request_moderated"]:
-                            logger.error(
-                                f"❌ User {user_id}: Generation failed with status '{current_status}' - {status}")
-                            break
-                        elif "not found" in str(status).lower():
-                            logger.error(
-                                f"❌ User {user_id}: Task not found - API returned: {status}")
-                            break
-                        # Log progress every 20 seconds
-                        elif (attempt + 1) % 20 == 0:
-                            logger.info(
-                                f"⏳ User {user_id}: Still processing (status: {current_status})... ({attempt + 1}s elapsed)")
-                    else:
-                        logger.warning(
-                            f"⚠️ User {user_id}: Polling timeout after 60 seconds - Last status: {status.get('status', 'unknown')}")
-                        image_url = None
-                else:
-                    image_url = None
-
             result = {
                 "user_id": user_id,
                 "product_name": product_name,
-                "image_url": image_url,
-                "prompt_used": prompt_str if isinstance(prompt, str) else json.dumps(prompt),
+                "image_url": None,
+                "prompt_used": prompt_str,
                 "dimensions": {"width": width, "height": height},
-                "status": "generated"
+                "status": None
             }
 
-            self.generated_images[user_id] = result
+            # Real Black Forest Labs API Integration
+            image_url, status = await self._generate_coalesced(
+                cache_key,
+                self._BFL_TEXT_TO_IMAGE_URL,
+                {
+                    "prompt": prompt_str,
+                    "width": width,
+                    "height": height,
+                    "prompt_upsampling": False,
+                    "safety_tolerance": 2
+                },
+                f"User {user_id}",
+                result
+            )
+            result = {**result, "image_url": image_url, "status": status}
 
-            logger.info(f"Image generated successfully for user {user_id}")
+            if status == STATUS_GENERATED:
+                self.generated_images[user_id] = result
+                logger.info(f"Image generated successfully for user {user_id}")
+            else:
+                logger.warning(
+                    f"Image generation for user {user_id} ended with status '{status}'")
             return result
 
         except Exception as e:
             logger.error(f"Error in Black Forest API call: {str(e)}")
-            return None
+            return {
+                "user_id": user_id,
+                "product_name": product_name,
+                "image_url": None,
+                "status": STATUS_ERROR,
+                "error": str(e)
+            }
 
     def _format_structured_prompt(self, structured_prompt: Dict[str, Any]) -> str:
         """
         Formats structured prompt into optimized text for Black Forest API
         Following: Subject + Action + Style + Context
         """
-        # Extract main subject
-        subjects = structured_prompt.get('subjects', [])
+        get = structured_prompt.get
+
+        # Priority: Subject → Action → Style → Context → Details
+        subjects = get('subjects')
         if subjects:
-            subject = subjects[0]['description']
-            action = subjects[0].get('pose', 'displayed prominently')
+            parts = [subjects[0]['description'],
+                     subjects[0].get('pose', _DEFAULT_SUBJECT[1])]
         else:
-            subject = "product"
-            action = "displayed prominently"
-
-        # Extract style and context
-        style = structured_prompt.get('style', 'professional photography')
-        scene = structured_prompt.get('scene', 'studio setup')
-        background = structured_prompt.get('background', 'clean backdrop')
-        lighting = structured_prompt.get('lighting', 'professional lighting')
-        mood = structured_prompt.get('mood', 'clean and professional')
-
-        # Get color palette
-        colors = structured_prompt.get('color_palette', [])
-        color_text = f"with {', '.join(colors[:3])} color palette" if colors else ""
+            parts = list(_DEFAULT_SUBJECT)
 
-        # Get camera settings for detail
-        camera = structured_prompt.get('camera', {})
-        camera_detail = f"{camera.get('angle', 'medium angle')}, {camera.get('focus', 'sharp focus')}"
+        parts.extend([get(key, default)
+                     for key, default in _PROMPT_DEFAULTS.items()])
 
-        # Build optimized prompt following FLUX.2 guidelines
-        # Priority: Subject → Action → Style → Context → Details
-        prompt_parts = [
-            f"{subject}, {action}",
-            f"{style}",
-            f"{scene}, {background}",
-            f"{lighting}, {mood}",
-            color_text,
-            camera_detail
-        ]
+        colors = get('color_palette')
+        if colors:
+            parts.append(f"with {', '.join(colors[:3])} color palette")
 
-        # Join and clean up
-        final_prompt = ", ".join([p for p in prompt_parts if p])
+        camera = get('camera') or _DEFAULT_CAMERA
+        parts.append(camera.get('angle', _DEFAULT_CAMERA['angle']))
+        parts.append(camera.get('focus', _DEFAULT_CAMERA['focus']))
 
-        return final_prompt
+        return ", ".join(filter(None, parts))
 
     async def generate_image_for_trend(
         self,
@@ -204,7 +565,7 @@ class ImageGenerationService:
         height: int = 768,
         reference_image_url: Optional[str] = None,
         image_prompt_strength: float = 0.3
-    ) -> Optional[Dict[str, Any]]:
+    ) -> Dict[str, Any]:
         """
         Generates an image for a specific trend category with optional product image reference
 
@@ -219,12 +580,19 @@ class ImageGenerationService:
                                   Lower = more freedom, Higher = closer to reference
 
         Returns:
-            Dictionary with image_url and metadata including trend_category
+            Dictionary with image_url, status and metadata including
+            trend_category (status "no_key" if generation was skipped
+            because no API key is set)
         """
         if not self.black_forest_api_key:
             logger.warning(
                 "Black Forest API Key missing - Image generation skipped")
-            return None
+            return {
+                "trend_category": trend_category,
+                "product_name": product_name,
+                "image_url": None,
+                "status": STATUS_NO_KEY
+            }
 
         try:
             # Convert structured prompt to string if needed
@@ -233,13 +601,18 @@ class ImageGenerationService:
             else:
                 prompt_str = prompt
 
+            cache_key = self._prompt_cache_key(
+                "trend", prompt_str, width, height, reference_image_url)
+            cached = self._get_cached_result(cache_key)
+            if cached:
+                logger.info(f"Prompt cache hit for trend {trend_category}")
+                return {**cached, "trend_category": trend_category,
+                        "product_name": product_name}
+
             logger.info(
                 f"Generating image for trend category: {trend_category}")
             logger.info(f"Prompt preview: {prompt_str[:150]}...")
             if reference_image_url:
-                # Show only first 50 chars of base64 to avoid log spam
-                img_preview = reference_image_url[:50] + "..." if len(
-                    reference_image_url) > 50 else reference_image_url
                 logger.info(
                     f"Using reference image ({len(reference_image_url)} chars) with strength: {image_prompt_strength}")
 
@@ -256,109 +629,48 @@ class ImageGenerationService:
             # FLUX.2 accepts both URLs and raw base64 (without data: prefix)
             if reference_image_url:
                 # Remove data URI prefix if present, API expects raw base64 or URL
-                if reference_image_url.startswith('data:'):
-                    # Extract raw base64: "data:image/jpeg;base64,ABC123..." -> "ABC123..."
-                    base64_data = reference_image_url.split(
-                        ',', 1)[1] if ',' in reference_image_url else reference_image_url
-                    request_payload["input_image"] = base64_data
-                else:
-                    request_payload["input_image"] = reference_image_url
+                # Extract raw base64: "data:image/jpeg;base64,ABC123..." -> "ABC123..."
+                # The data URI header is short, so only its first 64 chars are
+                # searched and the (multi-MB) base64 string is sliced only once
+                comma = reference_image_url.find(',', 0, 64) \
+                    if reference_image_url.startswith('data:') else -1
+                request_payload["input_image"] = reference_image_url[comma + 1:] \
+                    if comma != -1 else reference_image_url
                 # Note: image_prompt_strength not supported in FLUX.2, use prompt engineering instead
 
             # Real Black Forest Labs API Integration
             # Use flux-2-pro for image editing (with input_image), flux-pro-1.1 for text-to-image
-            endpoint = "https://api.bfl.ai/v1/flux-2-pro" if reference_image_url else "https://api.bfl.ml/v1/flux-pro-1.1"
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    endpoint,
-                    headers={
-                        "X-Key": self.black_forest_api_key,
-                        "Content-Type": "application/json"
-                    },
-                    json=request_payload,
-                    timeout=60.0
-                )
-                result = response.json()
-                # Log only status, not full response with base64 data
-                if response.status_code != 200:
-                    logger.error(
-                        f"Black Forest API Error for {trend_category}: Status {response.status_code}")
-                    if "detail" in result:
-                        logger.error(f"Error details: {result['detail']}")
-                else:
-                    logger.info(
-                        f"Black Forest Response for {trend_category}: Status {response.status_code} - Success")
-
-                # Parse response correctly
-                if "result" in result and result["result"]:
-                    # Immediate result (rare for FLUX.2)
-                    image_url = result["result"].get("sample")
-                elif "id" in result:
-                    # Async generation - need to poll
-                    task_id = result["id"]
-                    # Use polling_url from response or construct with correct domain
-                    polling_url = result.get(
-                        "polling_url", f"https://api.bfl.ai/v1/get_result?id={task_id}")
-                    logger.info(
-                        f"Polling task {task_id} for {trend_category} (max 60s)...")
-                    import asyncio
-                    for attempt in range(60):  # 60 seconds max
-                        await asyncio.sleep(1)
-                        status_resp = await client.get(
-                            polling_url,
-                            headers={"X-Key": self.black_forest_api_key}
-                        )
-                        status = status_resp.json()
-
-                        # DEBUG: Log full status on first attempt and every 20 seconds
-                        if attempt == 0 or (attempt + 1) % 20 == 0:
-                            logger.info(
-                                f"{trend_category}: Polling status at {attempt + 1}s: {status}")
-
-                        # Check status (case-insensitive)
-                        current_status = str(status.get("status", "")).lower()
-
-                        if current_status == "ready":
-                            image_url = status.get("result", {}).get("sample")
-                            logger.info(
-                                f"✅ {trend_category}: Image ready after {attempt + 1} seconds")
-                            break
-                        elif current_status in ["error", "failed", "request_moderated"]:
-                            logger.error(
-                                f"❌ {trend_category}: Generation failed with status '{current_status}' - {status}")
-                            break
-                        elif "not found" in str(status).lower():
-                            logger.error(
-                                f"❌ {trend_category}: Task not found - API returned: {status}")
-                            break
-                        # Log progress every 20 seconds
-                        elif (attempt + 1) % 20 == 0:
-                            logger.info(
-                                f"⏳ {trend_category}: Still processing (status: {current_status})... ({attempt + 1}s elapsed)")
-                    else:
-                        logger.warning(
-                            f"⚠️ {trend_category}: Polling timeout after 60 seconds - Last status: {status.get('status', 'unknown')}")
-                        image_url = None
-                else:
-                    image_url = None
-
+            endpoint = self._BFL_IMAGE_EDIT_URL if reference_image_url else self._BFL_TEXT_TO_IMAGE_URL
             result_data = {
                 "trend_category": trend_category,
                 "product_name": product_name,
-                "image_url": image_url,
+                "image_url": None,
                 "prompt_used": prompt_str,
                 "dimensions": {"width": width, "height": height},
-                "status": "generated"
+                "status": None
             }
+            image_url, status = await self._generate_coalesced(
+                cache_key, endpoint, request_payload, trend_category, result_data)
+            result_data = {**result_data, "image_url": image_url, "status": status}
 
-            logger.info(
-                f"Image URL for {trend_category}: {image_url}")
+            if status == STATUS_GENERATED:
+                logger.info(
+                    f"Image URL for {trend_category}: {image_url}")
+            else:
+                logger.warning(
+                    f"Image generation for trend {trend_category} ended with status '{status}'")
             return result_data
 
         except Exception as e:
             logger.error(
                 f"Error in Black Forest API call for trend {trend_category}: {str(e)}")
-            return None
+            return {
+                "trend_category": trend_category,
+                "product_name": product_name,
+                "image_url": None,
+                "status": STATUS_ERROR,
+                "error": str(e)
+            }
 
     async def generate_images_for_trends(
         self,
@@ -369,7 +681,7 @@ class ImageGenerationService:
     ) -> Dict[str, Dict[str, Any]]:
         """
         Generates images for multiple trend categories with optional product image reference
-        PARALLELIZED: All requests run concurrently for faster execution
+        PARALLELIZED: Requests run concurrently (max. BFL_MAX_CONCURRENCY at a time)
 
         Args:
             trend_prompts: Dictionary with trend_category -> prompt mappings
@@ -378,42 +690,35 @@ class ImageGenerationService:
             image_prompt_strength: Strength of image reference (0.0-1.0)
 
         Returns:
-            Dictionary with trend_category -> result mappings (containing image_url and metadata)
+            Dictionary with trend_category -> result mappings (containing image_url, status and metadata);
+            failed attempts are included with a status other than "generated"
         """
-        import asyncio
-
         logger.info(
             f"Starting parallel image generation for {len(trend_prompts)} trends...")
 
-        # Create tasks for parallel execution
-        tasks = []
-        trend_categories = []
-
-        for trend_category, prompt in trend_prompts.items():
-            task = self.generate_image_for_trend(
+        # Execute all tasks in parallel; gather keeps the input order, so
+        # results line up with the keys of trend_prompts
+        results_list = await asyncio.gather(*(
+            self._bounded(self.generate_image_for_trend(
                 prompt=prompt,
                 trend_category=trend_category,
                 product_name=product_name,
                 reference_image_url=reference_image_url,
                 image_prompt_strength=image_prompt_strength
-            )
-            tasks.append(task)
-            trend_categories.append(trend_category)
+            ))
+            for trend_category, prompt in trend_prompts.items()
+        ), return_exceptions=True)
 
-        # Execute all tasks in parallel
-        results_list = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # Build results dictionary
+        # Build results dictionary; failed attempts stay in it with their status
         results = {}
-        for trend_category, result in zip(trend_categories, results_list):
+        for trend_category, result in zip(trend_prompts, results_list):
             if isinstance(result, Exception):
                 logger.error(
                     f"Error generating image for {trend_category}: {str(result)}")
-            elif result:
+            else:
                 results[trend_category] = result
 
-        logger.info(
-            f"Parallel generation complete: {len(results)}/{len(trend_prompts)} images generated successfully")
+        self._log_batch_outcome(results, len(trend_prompts))
         return results
 
     async def generate_images_for_users(
@@ -423,7 +728,7 @@ class ImageGenerationService:
     ) -> Dict[int, Dict[str, Any]]:
         """
         Generates images for multiple users based on prompts
-        PARALLELIZED: All requests run concurrently for faster execution
+        PARALLELIZED: Requests run concurrently (max. BFL_MAX_CONCURRENCY at a time)
 
         Args:
             structured_prompts: Dictionary with user_id -> prompt mappings
@@ -431,67 +736,63 @@ class ImageGenerationService:
             product_name: Name of the product being advertised
 
         Returns:
-            Dictionary with user_id -> result mappings (containing image_url and metadata)
+            Dictionary with user_id -> result mappings (containing image_url, status and metadata);
+            failed attempts are included with a status other than "generated"
         """
-        import asyncio
-
         logger.info(
             f"Starting parallel image generation for {len(structured_prompts)} users...")
 
-        # Create tasks for parallel execution
-        tasks = []
-        user_ids = []
-
-        for user_id, prompt in structured_prompts.items():
-            task = self.generate_image_with_black_forest(
+        # Execute all tasks in parallel; gather keeps the input order, so
+        # results line up with the keys of structured_prompts
+        results_list = await asyncio.gather(*(
+            self._bounded(self.generate_image_with_black_forest(
                 prompt=prompt,
                 user_id=user_id,
                 product_name=product_name
-            )
-            tasks.append(task)
-            user_ids.append(user_id)
+            ))
+            for user_id, prompt in structured_prompts.items()
+        ), return_exceptions=True)
 
-        # Execute all tasks in parallel
-        results_list = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # Build results dictionary
+        # Build results dictionary; failed attempts stay in it with their status
         results = {}
-        for user_id, result in zip(user_ids, results_list):
+        for user_id, result in zip(structured_prompts, results_list):
             if isinstance(result, Exception):
                 logger.error(
                     f"Error generating image for user {user_id}: {str(result)}")
-            elif result:
+            else:
                 results[user_id] = result
 
-        logger.info(
-            f"Parallel generation complete: {len(results)}/{len(structured_prompts)} images generated successfully")
+        self._log_batch_outcome(results, len(structured_prompts))
         return results
 
+    def _log_batch_outcome(self, results: Dict[Any, Dict[str, Any]], total: int):
+        """Logs successful generations and failed attempts of a batch separately"""
+        failed = {key: result.get("status") for key, result in results.items()
+                  if result.get("status") != STATUS_GENERATED}
+        logger.info(
+            f"Parallel generation complete: {len(results) - len(failed)}/{total} images generated successfully")
+        if failed:
+            logger.warning(f"Image generation failed for {len(failed)}/{total}: {failed}")
+
     def get_cached_image(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Returns cached image result for a user"""
         return self.generated_images.get(user_id)
 
     def get_all_cached_images(self) -> Dict[int, Dict[str, Any]]:
-        """Returns all cached image results"""
-        return self.generated_images
+        """Returns a snapshot of all cached image results"""
+        return dict(self.generated_images)
 
     def cache_trend_image(self, trend_category: str, image_data: Dict[str, Any]):
         """Caches an image for a specific trend category"""
-        if not hasattr(self, 'trend_images'):
-            self.trend_images: Dict[str, Dict[str, Any]] = {}
         self.trend_images[trend_category] = image_data
 
     def get_trend_image(self, trend_category: str) -> Optional[Dict[str, Any]]:
         """Returns cached image for a trend category"""
-        if not hasattr(self, 'trend_images'):
-            return None
-        return getattr(self, 'trend_images', {}).get(trend_category)
+        return self.trend_images.get(trend_category)
 
     def get_all_trend_images(self) -> Dict[str, Dict[str, Any]]:
-        """Returns all cached trend images"""
-        if not hasattr(self, 'trend_images'):
-            self.trend_images = {}
-        return self.trend_images
+        """Returns a snapshot of all cached trend images"""
+        return dict(self.trend_images)
 
 
 # Singleton instance
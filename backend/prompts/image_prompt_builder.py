@@ -1,15 +1,204 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Set, Tuple
 import logging
-import json
+import os
+import orjson
+
+from prompts.lru_cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+# Category -> dramatic mood / color palette / action background for trend prompts
+_MOOD_MAP = {
+    "Technology": "Cutting-edge, electrifying, fast-paced, futuristic innovation in action",
+    "Sports": "Adrenaline-pumping, competitive, explosive energy, championship intensity",
+    "Food": "Sensory explosion, culinary drama, sizzling action, gastronomic excitement",
+    "Travel": "Thrilling adventure, breathtaking discovery, wanderlust in motion, epic exploration",
+    "Entertainment": "Show-stopping, electrifying performance, crowd-energizing, spectacular drama",
+    "Gaming": "Intense competition, esports championship, high-stakes gaming action, electric atmosphere",
+}
+_DEFAULT_MOOD = "Dynamic, action-packed, cinematic energy, dramatic excitement"
+
+_PALETTE_MAP = {
+    "Technology": ("sleek black", "metallic silver", "electric blue", "pure white"),
+    "Sports": ("vibrant red", "energetic orange", "fresh green", "deep blue"),
+    "Food": ("warm brown", "rich red", "fresh green", "golden yellow"),
+    "Travel": ("sky blue", "sunset orange", "earth brown", "ocean teal"),
+    "Entertainment": ("vibrant purple", "bold red", "golden yellow", "deep blue"),
+}
+_DEFAULT_PALETTE = ("sophisticated navy", "warm beige", "soft white", "accent gold")
+
+# Matched-interest categories -> palette for user prompts, checked in order
+_INTEREST_PALETTES = (
+    ("Technology & Innovation", _PALETTE_MAP["Technology"]),
+    ("Sports & Fitness", _PALETTE_MAP["Sports"]),
+    ("Food & Dining", _PALETTE_MAP["Food"]),
+    ("Travel & Adventure", _PALETTE_MAP["Travel"]),
+    ("Entertainment & Culture", _PALETTE_MAP["Entertainment"]),
+)
+_NEUTRAL_PALETTE = ("clean white", "soft gray", "muted blue", "warm beige")
+
+# Matched-interest categories -> mood for user prompts, checked in order
+_INTEREST_MOODS = (
+    ("Technology & Innovation", "Sleek, modern, innovative, tech-forward"),
+    ("Sports & Fitness", "Energetic, dynamic, active, motivating"),
+    ("Food & Dining", "Warm, inviting, appetizing, gourmet"),
+    ("Travel & Adventure", "Adventurous, exciting, wanderlust, aspirational"),
+    ("Entertainment & Culture", "Vibrant, engaging, culturally rich, entertaining"),
+)
+_NEUTRAL_MOOD = "Clean, professional, aspirational"
+_DEFAULT_USER_MOOD = "Clean, professional, lifestyle-oriented, aspirational"
+
+# (category, top interest or None, background) for user prompts, checked in order
+_INTEREST_BACKGROUNDS = (
+    ("Technology & Innovation", "AI",
+     "Modern minimalist space with subtle tech elements, clean lines, futuristic ambiance"),
+    ("Sports & Fitness", "Running",
+     "Active lifestyle setting with subtle athletic elements, energetic atmosphere"),
+    ("Food & Dining", None,
+     "Elegant dining atmosphere with subtle gourmet elements, warm ambiance"),
+    ("Travel & Adventure", None,
+     "Sophisticated travel-inspired setting with subtle adventure elements"),
+)
+_NEUTRAL_BACKGROUND = "Clean studio backdrop with neutral gradient"
+_DEFAULT_USER_BACKGROUND = "Professional lifestyle setting with clean, aspirational atmosphere"
+
+_BACKGROUND_MAP = {
+    "Technology": "High-tech innovation lab with glowing displays and data streams, futuristic action environment",
+    "Sports": "Championship stadium or competition venue with crowds cheering, athletic action scene",
+    "Food": "Bustling professional kitchen mid-service with flames and motion, culinary action",
+    "Travel": "Exotic destination with dramatic landscape and adventure in progress, exploration scene",
+    "Entertainment": "Concert stage with dramatic lighting and crowd energy, performance in action",
+    "Gaming": "Professional esports arena with massive screens and tournament atmosphere, competitive gaming action",
+    "Music": "Live music venue mid-performance with stage lights and crowd energy, concert action",
+    "Fashion": "Fashion show runway with dramatic lighting and audience, style showcase in motion",
+}
+_DEFAULT_BACKGROUND = "Dynamic action environment with dramatic details and cinematic energy"
+
+# Category -> lifestyle props when a trend prompt has no interest
+_ELEMENTS_MAP = {
+    "Technology": "laptop and smartphone in soft focus background",
+    "Sports": "sports equipment in background",
+    "Gaming": "gaming controller in soft focus background",
+    "Travel": "map or travel items in background",
+    "Food": "fresh ingredients in background",
+    "Music": "headphones in background",
+    "Fashion": "fabric swatches in background",
+    "Health": "wellness items in background",
+    "Outdoor": "natural elements in background",
+}
+_DEFAULT_ELEMENTS = "subtle lifestyle props in soft focus background"
+
+# Interest keywords -> atmospheric environment, checked in order (first match wins).
+# Plain substring keywords, same semantics as the former `in` checks.
+_INTEREST_ATMOSPHERES = (
+    (("machine learning", "deep learning"),
+     "modern tech workspace atmosphere with subtle digital elements and clean minimalist aesthetic in background"),
+    (("chatgpt", "ai"),
+     "contemporary digital workspace environment with soft ambient glow and technological aesthetic"),
+    (("trail running",),
+     "natural outdoor environment with organic textures and athletic energy in the atmospheric background"),
+    (("marathon", "running"),
+     "active lifestyle setting with dynamic energy and achievement-oriented atmosphere"),
+    (("pc gaming",),
+     "immersive gaming setup environment with ambient lighting and entertainment-focused atmosphere"),
+    (("mobile gaming",),
+     "casual entertainment space with modern digital lifestyle aesthetic"),
+    (("rpg games", "indie games"),
+     "creative gaming atmosphere with artistic and immersive environmental qualities"),
+    (("portrait photography", "street photography"),
+     "artistic creative workspace with visual storytelling atmosphere and professional aesthetic"),
+    (("photo editing",),
+     "digital creative studio environment with focused artistic workflow atmosphere"),
+    (("vegan cooking",),
+     "natural wholesome kitchen atmosphere with organic textures and fresh healthy lifestyle aesthetic"),
+    (("meal prep",),
+     "organized culinary workspace with efficient lifestyle atmosphere and clean aesthetic"),
+    (("cooking", "international cuisine"),
+     "gourmet kitchen environment with culinary passion and sophisticated food culture atmosphere"),
+    (("live music", "indie music"),
+     "artistic musical atmosphere with creative energy and cultural lifestyle aesthetic"),
+    (("guitar",),
+     "musical creative space with artistic expression and melodic atmosphere"),
+    (("beach holidays", "island hopping"),
+     "relaxed travel lifestyle atmosphere with wanderlust aesthetic and vacation vibes"),
+    (("travel photography",),
+     "adventurous explorer environment with worldly atmosphere and discovery aesthetic"),
+    (("wine tasting", "wine pairing"),
+     "sophisticated sommelier atmosphere with refined taste and elegant lifestyle aesthetic"),
+    (("fine dining", "restaurant reviews"),
+     "upscale culinary setting with gourmet atmosphere and refined dining aesthetic"),
+    (("crossfit",),
+     "intense athletic training environment with performance-focused atmosphere and fitness dedication"),
+    (("fitness training",),
+     "active wellness lifestyle setting with health-conscious atmosphere and motivational energy"),
+    (("netflix binging", "streaming"),
+     "cozy entertainment space with relaxed viewing atmosphere and comfortable lifestyle aesthetic"),
+    (("basketball",),
+     "dynamic sports environment with athletic energy and competitive spirit atmosphere"),
+    (("football",),
+     "energetic sports setting with team spirit and athletic lifestyle atmosphere"),
+    (("strategy games",),
+     "focused gaming workspace with tactical thinking atmosphere and competitive aesthetic"),
+    (("5g technology", "wearable tech"),
+     "cutting-edge tech lifestyle environment with innovative atmosphere and futuristic aesthetic"),
+    (("smart home",),
+     "intelligent connected living space with automated lifestyle atmosphere and modern convenience"),
+)
+
 
 class ImagePromptBuilder:
     """Service for building structured prompts for Black Forest Labs image generation"""
 
+    # Invariant parts of the structured prompts, built once at import.
+    # Dynamic keys are None placeholders so copies keep the original key order.
+    # The camera records are shared by all prompts and must not be mutated.
+    _TREND_CAMERA = {
+        "angle": "slightly elevated angle for premium feel",
+        "distance": "medium shot emphasizing product",
+        "focus": "Sharp focus on product details with subtle depth of field on background",
+        "lens-mm": 85,
+        "f-number": "f/4.0",
+        "ISO": 200
+    }
+    _USER_CAMERA = {
+        **_TREND_CAMERA,
+        "focus": "Sharp focus on main product with subtle depth of field"
+    }
+    _TREND_TEMPLATE = {
+        "scene": None,
+        "subjects": None,
+        "context": None,
+        "style": "Cinematic action photography with dramatic composition and motion",
+        "color_palette": None,
+        "lighting": "Dramatic cinematic lighting with motion blur and dynamic highlights",
+        "mood": None,
+        "background": None,
+        "composition": "dynamic action composition with product as the hero in motion",
+        "camera": None
+    }
+    _USER_TEMPLATE = {
+        "scene": None,
+        "subjects": None,
+        "context": None,
+        "style": None,
+        "color_palette": None,
+        "lighting": "Three-point softbox setup creating soft, diffused highlights with no harsh shadows, professional studio lighting",
+        "mood": None,
+        "background": None,
+        "composition": "rule of thirds with clear focus on product",
+        "camera": None
+    }
+
     def __init__(self):
-        self.prompt_cache: Dict[int, Dict[str, Any]] = {}
+        # Bounded so the cache does not grow with every distinct user
+        self.prompt_cache: LRUCache = LRUCache(
+            int(os.getenv("PROMPT_CACHE_MAX", "1024")))
+        # Product-independent part of trend prompts by (category, primary interest)
+        self._trend_skeletons: LRUCache = LRUCache(256)
+        # User prompts by everything they are built from, so users with the
+        # same persona and matches share one prompt (see _persona_key)
+        self._persona_prompts: LRUCache = LRUCache(
+            int(os.getenv("PROMPT_CACHE_MAX", "1024")))
 
     def build_prompt_for_trend(
         self,
@@ -29,56 +218,110 @@ class ImagePromptBuilder:
             additional_context: Optional additional context
 
         Returns:
-            Structured prompt dictionary following Black Forest guidelines
+            Structured prompt dictionary following Black Forest guidelines.
+            Nested values are shared with other prompts of the same trend - treat them as read-only.
+        """
+        # Only the first interest influences the prompt
+        skeleton = self._trend_skeleton(
+            trend_category, trend_interests[0] if trend_interests else None)
+
+        structured_prompt = self._apply_product(
+            skeleton, product_description, additional_context)
+
+        logger.info(
+            "Built structured prompt for trend category: %s", trend_category)
+        return structured_prompt
+
+    def build_prompts_for_trends(
+        self,
+        requests: List[Tuple[str, str, List[str], Optional[str]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Builds trend prompts for several requests at once.
+        Each skeleton is looked up once per (category, primary interest) in the batch.
+
+        Args:
+            requests: (product_description, trend_category, trend_interests, additional_context) tuples
+
+        Returns:
+            Structured prompts in request order (see build_prompt_for_trend)
         """
+        skeletons: Dict[Tuple[str, Optional[str]], Dict[str, Any]] = {}
+        prompts = []
+        for product_description, trend_category, trend_interests, additional_context in requests:
+            key = (trend_category, trend_interests[0] if trend_interests else None)
+            skeleton = skeletons.get(key)
+            if skeleton is None:
+                skeleton = skeletons[key] = self._trend_skeleton(*key)
+            prompts.append(self._apply_product(
+                skeleton, product_description, additional_context))
+
+        logger.info(
+            "Built %s structured trend prompts from %s skeletons", len(prompts), len(skeletons))
+        return prompts
+
+    def _apply_product(
+        self,
+        skeleton: Dict[str, Any],
+        product_description: str,
+        additional_context: Optional[str]
+    ) -> Dict[str, Any]:
+        """Overlays the product on a trend skeleton; everything else is shared"""
+        structured_prompt = skeleton.copy()
+        structured_prompt["subjects"] = [
+            {
+                **skeleton["subjects"][0],
+                "description": f"{product_description} as the hero"
+            }
+        ]
+
+        if additional_context:
+            structured_prompt["additional_details"] = additional_context
+
+        return structured_prompt
+
+    def _trend_skeleton(self, trend_category: str, primary_interest: Optional[str]) -> Dict[str, Any]:
+        """Returns the cached trend prompt without the product-specific subject description"""
+        cache_key = (trend_category, primary_interest)
+        skeleton = self._trend_skeletons.get(cache_key)
+        if skeleton is not None:
+            return skeleton
+
         mood = self._determine_mood_for_category(trend_category)
         color_palette = self._generate_color_palette_for_category(
             trend_category)
-        background = self._generate_background_for_category(
-            trend_category, trend_interests)
+        background = self._generate_background_for_category(trend_category)
 
         # Build lifestyle elements based on SINGLE MOST RELEVANT interest (not multiple)
         lifestyle_elements = self._generate_lifestyle_elements_for_trend(
-            trend_category, trend_interests[:1]
+            trend_category, primary_interest
         )
 
-        structured_prompt = {
-            "scene": f"DYNAMIC ACTION SCENARIO: {lifestyle_elements}",
-            "subjects": [
-                {
-                    "description": f"{product_description} as the hero",
-                    "pose": "IN MOTION, ACTIVELY BEING USED in dramatic action",
-                    "position": "Dynamic positioning in the middle of the action scene",
-                    "color_palette": color_palette[:2]
-                }
-            ],
-            "context": {
-                "trend_category": trend_category,
-                "primary_interest": trend_interests[0] if trend_interests else trend_category,
-                "lifestyle_theme": f"Show product IN DRAMATIC ACTION specifically matching {trend_interests[0] if trend_interests else trend_category} niche - use SPECIFIC locations, CINEMATIC motion, and UNEXPECTED creative scenarios"
-            },
-            "style": "Cinematic action photography with dramatic composition and motion",
-            "color_palette": color_palette,
-            "lighting": "Dramatic cinematic lighting with motion blur and dynamic highlights",
-            "mood": mood,
-            "background": background,
-            "composition": "dynamic action composition with product as the hero in motion",
-            "camera": {
-                "angle": "slightly elevated angle for premium feel",
-                "distance": "medium shot emphasizing product",
-                "focus": "Sharp focus on product details with subtle depth of field on background",
-                "lens-mm": 85,
-                "f-number": "f/4.0",
-                "ISO": 200
+        if primary_interest is None:
+            primary_interest = trend_category
+
+        skeleton = self._TREND_TEMPLATE.copy()
+        skeleton["scene"] = f"DYNAMIC ACTION SCENARIO: {lifestyle_elements}"
+        skeleton["subjects"] = [
+            {
+                "description": None,
+                "pose": "IN MOTION, ACTIVELY BEING USED in dramatic action",
+                "position": "Dynamic positioning in the middle of the action scene",
+                "color_palette": color_palette[:2]
             }
+        ]
+        skeleton["context"] = {
+            "trend_category": trend_category,
+            "primary_interest": primary_interest,
+            "lifestyle_theme": f"Show product IN DRAMATIC ACTION specifically matching {primary_interest} niche - use SPECIFIC locations, CINEMATIC motion, and UNEXPECTED creative scenarios"
         }
+        skeleton["color_palette"] = color_palette
+        skeleton["mood"] = mood
+        skeleton["background"] = background
+        skeleton["camera"] = self._TREND_CAMERA
 
-        if additional_context:
-            structured_prompt["additional_details"] = additional_context
-
-        logger.info(
-            f"Built structured prompt for trend category: {trend_category}")
-        return structured_prompt
+        self._trend_skeletons[cache_key] = skeleton
+        return skeleton
 
     def build_structured_prompt(
         self,
@@ -97,96 +340,116 @@ class ImagePromptBuilder:
             additional_context: Optional additional context for the scene
 
         Returns:
-            Structured prompt dictionary following Black Forest guidelines
+            Structured prompt dictionary following Black Forest guidelines.
+            Users with identical persona and matches share the same dictionary - treat it as read-only.
         """
+        persona_key = self._persona_key(
+            product_description, user_data, matched_interests, additional_context)
+        structured_prompt = self._persona_prompts.get(persona_key)
+        if structured_prompt is None:
+            structured_prompt = self._build_persona_prompt(
+                product_description, user_data, matched_interests, additional_context)
+            self._persona_prompts[persona_key] = structured_prompt
+
+        # Cache the prompt
+        self.prompt_cache[user_data['id']] = structured_prompt
+
+        logger.info(
+            "Built structured image prompt for user %s (ID: %s)", user_data.get('name', 'User'), user_data['id'])
+
+        return structured_prompt
+
+    def _persona_key(
+        self,
+        product_description: str,
+        user_data: Dict[str, Any],
+        matched_interests: List[Dict[str, Any]],
+        additional_context: Optional[str]
+    ) -> Tuple:
+        """Exactly the inputs _build_persona_prompt reads (not name/id)"""
+        return (
+            product_description,
+            user_data.get('age', 30),
+            user_data['demographics'].get('occupation'),
+            user_data.get('location', 'City'),
+            user_data.get('language'),
+            tuple((m['interest'], m['category']) for m in matched_interests),
+            additional_context
+        )
+
+    def _build_persona_prompt(
+        self,
+        product_description: str,
+        user_data: Dict[str, Any],
+        matched_interests: List[Dict[str, Any]],
+        additional_context: Optional[str]
+    ) -> Dict[str, Any]:
+        """Builds the structured user prompt (uncached)"""
         # Extract key information
-        user_name = user_data.get('name', 'User')
+        demographics = user_data['demographics']
         user_age = user_data.get('age', 30)
-        user_occupation = user_data['demographics'].get(
-            'occupation', 'Professional')
+        user_occupation = demographics.get('occupation', 'Professional')
         user_location = user_data.get('location', 'City')
         user_language = user_data.get('language')
 
-        # Get top 3 trending interests
-        top_interests = [m['interest']
-                         for m in matched_interests[:3]] if matched_interests else []
-        trend_categories = list(
-            set([m['category'] for m in matched_interests[:3]])) if matched_interests else []
+        # Single pass over the matches: top 3 interests, their categories
+        # (deduplicated, first seen first) and all categories for the helpers
+        top_interests: List[str] = []
+        trend_categories: List[str] = []
+        categories: Set[str] = set()
+        for index, match in enumerate(matched_interests):
+            category = match['category']
+            if index < 3:
+                top_interests.append(match['interest'])
+                if category not in trend_categories:
+                    trend_categories.append(category)
+            categories.add(category)
 
         # Build mood and style based on interests and demographics
-        mood = self._determine_mood(matched_interests, user_data)
+        mood = self._determine_mood(categories)
         style = self._determine_visual_style(user_age, user_occupation)
-        color_palette = self._generate_color_palette(matched_interests)
+        color_palette = self._generate_color_palette(categories)
 
         # Build the structured prompt
-        structured_prompt = {
-            "scene": f"Professional advertising photography setup with {product_description} as the hero product",
-            "subjects": [
-                {
-                    "description": product_description,
-                    "pose": "Prominently displayed with appealing presentation",
-                    "position": "Center foreground on clean surface",
-                    "color_palette": color_palette[:2]
-                }
-            ],
-            "context": {
-                "target_audience": f"{user_age} year old {user_occupation} from {user_location}",
-                "trending_interests": top_interests,
-                "trend_categories": trend_categories,
-                "lifestyle_integration": self._generate_lifestyle_context(matched_interests, user_data),
-                "language_instruction": f"If the uploaded image contains any text or should include any, it should be translated/added in {user_language}"
-            },
-            "style": f"{style}, ultra-realistic advertising photography with commercial quality",
-            "color_palette": color_palette,
-            "lighting": "Three-point softbox setup creating soft, diffused highlights with no harsh shadows, professional studio lighting",
-            "mood": mood,
-            "background": self._generate_background(matched_interests, user_data),
-            "composition": "rule of thirds with clear focus on product",
-            "camera": {
-                "angle": "slightly elevated angle for premium feel",
-                "distance": "medium shot emphasizing product",
-                "focus": "Sharp focus on main product with subtle depth of field",
-                "lens-mm": 85,
-                "f-number": "f/4.0",
-                "ISO": 200
+        structured_prompt = self._USER_TEMPLATE.copy()
+        structured_prompt["scene"] = f"Professional advertising photography setup with {product_description} as the hero product"
+        structured_prompt["subjects"] = [
+            {
+                "description": product_description,
+                "pose": "Prominently displayed with appealing presentation",
+                "position": "Center foreground on clean surface",
+                "color_palette": color_palette[:2]
             }
+        ]
+        structured_prompt["context"] = {
+            "target_audience": f"{user_age} year old {user_occupation} from {user_location}",
+            "trending_interests": top_interests,
+            "trend_categories": trend_categories,
+            "lifestyle_integration": self._generate_lifestyle_context(
+                top_interests, demographics.get('occupation', 'professional')),
+            "language_instruction": f"If the uploaded image contains any text or should include any, it should be translated/added in {user_language}"
         }
+        structured_prompt["style"] = f"{style}, ultra-realistic advertising photography with commercial quality"
+        structured_prompt["color_palette"] = color_palette
+        structured_prompt["mood"] = mood
+        structured_prompt["background"] = self._generate_background(
+            categories, top_interests)
+        structured_prompt["camera"] = self._USER_CAMERA
 
         if additional_context:
             structured_prompt["additional_details"] = additional_context
 
-        # Cache the prompt
-        self.prompt_cache[user_data['id']] = structured_prompt
-
-        logger.info(
-            f"Built structured image prompt for user {user_name} (ID: {user_data['id']})")
-
         return structured_prompt
 
-    def _determine_mood(
-        self,
-        matched_interests: List[Dict[str, Any]],
-        user_data: Dict[str, Any]
-    ) -> str:
-        """Determines the mood based on user interests and demographics"""
-        if not matched_interests:
-            return "Clean, professional, aspirational"
-
-        categories = [m['category'] for m in matched_interests]
-
-        # Map categories to moods
-        if 'Technology & Innovation' in categories:
-            return "Sleek, modern, innovative, tech-forward"
-        elif 'Sports & Fitness' in categories:
-            return "Energetic, dynamic, active, motivating"
-        elif 'Food & Dining' in categories:
-            return "Warm, inviting, appetizing, gourmet"
-        elif 'Travel & Adventure' in categories:
-            return "Adventurous, exciting, wanderlust, aspirational"
-        elif 'Entertainment & Culture' in categories:
-            return "Vibrant, engaging, culturally rich, entertaining"
-        else:
-            return "Clean, professional, lifestyle-oriented, aspirational"
+    def _determine_mood(self, categories: Set[str]) -> str:
+        """Determines the mood based on the categories of the matched interests"""
+        if not categories:
+            return _NEUTRAL_MOOD
+
+        for category, mood in _INTEREST_MOODS:
+            if category in categories:
+                return mood
+        return _DEFAULT_USER_MOOD
 
     def _determine_visual_style(self, age: int, occupation: str) -> str:
         """Determines visual style based on demographics"""
@@ -197,176 +460,56 @@ class ImagePromptBuilder:
         else:
             return "Classic, refined, premium quality"
 
-    def _generate_color_palette(self, matched_interests: List[Dict[str, Any]]) -> List[str]:
-        """Generates color palette based on trending interests"""
-        if not matched_interests:
-            return ["clean white", "soft gray", "muted blue", "warm beige"]
-
-        categories = [m['category'] for m in matched_interests]
-
-        # Map categories to color palettes
-        if 'Technology & Innovation' in categories:
-            return ["sleek black", "metallic silver", "electric blue", "pure white"]
-        elif 'Sports & Fitness' in categories:
-            return ["vibrant red", "energetic orange", "fresh green", "deep blue"]
-        elif 'Food & Dining' in categories:
-            return ["warm brown", "rich red", "fresh green", "golden yellow"]
-        elif 'Travel & Adventure' in categories:
-            return ["sky blue", "sunset orange", "earth brown", "ocean teal"]
-        elif 'Entertainment & Culture' in categories:
-            return ["vibrant purple", "bold red", "golden yellow", "deep blue"]
-        else:
-            return ["sophisticated navy", "warm beige", "soft white", "accent gold"]
+    def _generate_color_palette(self, categories: Set[str]) -> Tuple[str, ...]:
+        """Generates color palette based on the categories of the matched interests"""
+        if not categories:
+            return _NEUTRAL_PALETTE
 
-    def _generate_background(
-        self,
-        matched_interests: List[Dict[str, Any]],
-        user_data: Dict[str, Any]
-    ) -> str:
-        """Generates background description based on user context"""
-        if not matched_interests:
-            return "Clean studio backdrop with neutral gradient"
-
-        categories = [m['category'] for m in matched_interests]
-        interests = [m['interest'] for m in matched_interests[:3]]
-
-        # Create contextual background
-        if 'Technology & Innovation' in categories or 'AI' in interests:
-            return "Modern minimalist space with subtle tech elements, clean lines, futuristic ambiance"
-        elif 'Sports & Fitness' in categories or 'Running' in interests:
-            return "Active lifestyle setting with subtle athletic elements, energetic atmosphere"
-        elif 'Food & Dining' in categories:
-            return "Elegant dining atmosphere with subtle gourmet elements, warm ambiance"
-        elif 'Travel & Adventure' in categories:
-            return "Sophisticated travel-inspired setting with subtle adventure elements"
-        else:
-            return "Professional lifestyle setting with clean, aspirational atmosphere"
+        for category, palette in _INTEREST_PALETTES:
+            if category in categories:
+                return palette
+        return _DEFAULT_PALETTE
+
+    def _generate_background(self, categories: Set[str], interests: List[str]) -> str:
+        """Generates background description from matched categories and top interests"""
+        if not categories:
+            return _NEUTRAL_BACKGROUND
+
+        for category, interest, background in _INTEREST_BACKGROUNDS:
+            if category in categories or (interest is not None and interest in interests):
+                return background
+        return _DEFAULT_USER_BACKGROUND
 
     def _determine_mood_for_category(self, category: str) -> str:
         """Determines DRAMATIC, ACTION-ORIENTED mood based on trend category"""
-        mood_map = {
-            "Technology": "Cutting-edge, electrifying, fast-paced, futuristic innovation in action",
-            "Sports": "Adrenaline-pumping, competitive, explosive energy, championship intensity",
-            "Food": "Sensory explosion, culinary drama, sizzling action, gastronomic excitement",
-            "Travel": "Thrilling adventure, breathtaking discovery, wanderlust in motion, epic exploration",
-            "Entertainment": "Show-stopping, electrifying performance, crowd-energizing, spectacular drama",
-            "Gaming": "Intense competition, esports championship, high-stakes gaming action, electric atmosphere"
-        }
-        return mood_map.get(category, "Dynamic, action-packed, cinematic energy, dramatic excitement")
+        return _MOOD_MAP.get(category, _DEFAULT_MOOD)
 
-    def _generate_color_palette_for_category(self, category: str) -> List[str]:
+    def _generate_color_palette_for_category(self, category: str) -> Tuple[str, ...]:
         """Generates color palette based on trend category"""
-        palette_map = {
-            "Technology": ["sleek black", "metallic silver", "electric blue", "pure white"],
-            "Sports": ["vibrant red", "energetic orange", "fresh green", "deep blue"],
-            "Food": ["warm brown", "rich red", "fresh green", "golden yellow"],
-            "Travel": ["sky blue", "sunset orange", "earth brown", "ocean teal"],
-            "Entertainment": ["vibrant purple", "bold red", "golden yellow", "deep blue"]
-        }
-        return palette_map.get(category, ["sophisticated navy", "warm beige", "soft white", "accent gold"])
+        return _PALETTE_MAP.get(category, _DEFAULT_PALETTE)
 
-    def _generate_background_for_category(self, category: str, interests: List[str]) -> str:
+    def _generate_background_for_category(self, category: str) -> str:
         """Generates DYNAMIC ACTION background description for trend category"""
-        background_map = {
-            "Technology": "High-tech innovation lab with glowing displays and data streams, futuristic action environment",
-            "Sports": "Championship stadium or competition venue with crowds cheering, athletic action scene",
-            "Food": "Bustling professional kitchen mid-service with flames and motion, culinary action",
-            "Travel": "Exotic destination with dramatic landscape and adventure in progress, exploration scene",
-            "Entertainment": "Concert stage with dramatic lighting and crowd energy, performance in action",
-            "Gaming": "Professional esports arena with massive screens and tournament atmosphere, competitive gaming action",
-            "Music": "Live music venue mid-performance with stage lights and crowd energy, concert action",
-            "Fashion": "Fashion show runway with dramatic lighting and audience, style showcase in motion"
-        }
-        return background_map.get(category, "Dynamic action environment with dramatic details and cinematic energy")
+        return _BACKGROUND_MAP.get(category, _DEFAULT_BACKGROUND)
 
-    def _generate_lifestyle_elements_for_trend(self, category: str, interests: List[str]) -> str:
+    def _generate_lifestyle_elements_for_trend(self, category: str, interest: Optional[str]) -> str:
         """Generates atmospheric lifestyle environment based on interest theme - abstract and immersive"""
-        # Select the FIRST interest and translate to atmospheric description
-        if interests:
-            interest = interests[0]
+        # Translate the primary interest to an atmospheric description
+        if interest is not None:
             interest_lower = interest.lower()
 
             # Map interests to ATMOSPHERIC ENVIRONMENTS rather than single objects
-            if "machine learning" in interest_lower or "deep learning" in interest_lower:
-                return "modern tech workspace atmosphere with subtle digital elements and clean minimalist aesthetic in background"
-            elif "chatgpt" in interest_lower or "ai" in interest_lower:
-                return "contemporary digital workspace environment with soft ambient glow and technological aesthetic"
-            elif "trail running" in interest_lower:
-                return "natural outdoor environment with organic textures and athletic energy in the atmospheric background"
-            elif "marathon" in interest_lower or "running" in interest_lower:
-                return "active lifestyle setting with dynamic energy and achievement-oriented atmosphere"
-            elif "pc gaming" in interest_lower:
-                return "immersive gaming setup environment with ambient lighting and entertainment-focused atmosphere"
-            elif "mobile gaming" in interest_lower:
-                return "casual entertainment space with modern digital lifestyle aesthetic"
-            elif "rpg games" in interest_lower or "indie games" in interest_lower:
-                return "creative gaming atmosphere with artistic and immersive environmental qualities"
-            elif "portrait photography" in interest_lower or "street photography" in interest_lower:
-                return "artistic creative workspace with visual storytelling atmosphere and professional aesthetic"
-            elif "photo editing" in interest_lower:
-                return "digital creative studio environment with focused artistic workflow atmosphere"
-            elif "vegan cooking" in interest_lower:
-                return "natural wholesome kitchen atmosphere with organic textures and fresh healthy lifestyle aesthetic"
-            elif "meal prep" in interest_lower:
-                return "organized culinary workspace with efficient lifestyle atmosphere and clean aesthetic"
-            elif "cooking" in interest_lower or "international cuisine" in interest_lower:
-                return "gourmet kitchen environment with culinary passion and sophisticated food culture atmosphere"
-            elif "live music" in interest_lower or "indie music" in interest_lower:
-                return "artistic musical atmosphere with creative energy and cultural lifestyle aesthetic"
-            elif "guitar" in interest_lower or "playing guitar" in interest_lower:
-                return "musical creative space with artistic expression and melodic atmosphere"
-            elif "beach holidays" in interest_lower or "island hopping" in interest_lower:
-                return "relaxed travel lifestyle atmosphere with wanderlust aesthetic and vacation vibes"
-            elif "travel photography" in interest_lower:
-                return "adventurous explorer environment with worldly atmosphere and discovery aesthetic"
-            elif "wine tasting" in interest_lower or "wine pairing" in interest_lower:
-                return "sophisticated sommelier atmosphere with refined taste and elegant lifestyle aesthetic"
-            elif "fine dining" in interest_lower or "restaurant reviews" in interest_lower:
-                return "upscale culinary setting with gourmet atmosphere and refined dining aesthetic"
-            elif "crossfit" in interest_lower:
-                return "intense athletic training environment with performance-focused atmosphere and fitness dedication"
-            elif "fitness training" in interest_lower:
-                return "active wellness lifestyle setting with health-conscious atmosphere and motivational energy"
-            elif "netflix binging" in interest_lower or "streaming" in interest_lower:
-                return "cozy entertainment space with relaxed viewing atmosphere and comfortable lifestyle aesthetic"
-            elif "basketball" in interest_lower:
-                return "dynamic sports environment with athletic energy and competitive spirit atmosphere"
-            elif "football" in interest_lower or "playing football" in interest_lower:
-                return "energetic sports setting with team spirit and athletic lifestyle atmosphere"
-            elif "strategy games" in interest_lower:
-                return "focused gaming workspace with tactical thinking atmosphere and competitive aesthetic"
-            elif "5g technology" in interest_lower or "wearable tech" in interest_lower:
-                return "cutting-edge tech lifestyle environment with innovative atmosphere and futuristic aesthetic"
-            elif "smart home" in interest_lower:
-                return "intelligent connected living space with automated lifestyle atmosphere and modern convenience"
-            else:
-                # Abstract interpretation of any interest
-                # Fallback to category-based
-                return f"{interest} inspired lifestyle environment with thematic atmosphere and cultural aesthetic"
-        elements_map = {
-            "Technology": "laptop and smartphone in soft focus background",
-            "Sports": "sports equipment in background",
-            "Gaming": "gaming controller in soft focus background",
-            "Travel": "map or travel items in background",
-            "Food": "fresh ingredients in background",
-            "Music": "headphones in background",
-            "Fashion": "fabric swatches in background",
-            "Health": "wellness items in background",
-            "Outdoor": "natural elements in background"
-        }
-        return elements_map.get(category, "subtle lifestyle props in soft focus background")
+            for keywords, atmosphere in _INTEREST_ATMOSPHERES:
+                if any(keyword in interest_lower for keyword in keywords):
+                    return atmosphere
 
-    def _generate_lifestyle_context(
-        self,
-        matched_interests: List[Dict[str, Any]],
-        user_data: Dict[str, Any]
-    ) -> str:
-        """Generates lifestyle integration context"""
-        interests = [m['interest']
-                     for m in matched_interests[:3]] if matched_interests else []
-        occupation = user_data['demographics'].get(
-            'occupation', 'professional')
+            # Abstract interpretation of any interest
+            # Fallback to category-based
+            return f"{interest} inspired lifestyle environment with thematic atmosphere and cultural aesthetic"
+        return _ELEMENTS_MAP.get(category, _DEFAULT_ELEMENTS)
 
+    def _generate_lifestyle_context(self, interests: List[str], occupation: str) -> str:
+        """Generates lifestyle integration context"""
         if interests:
             return f"Product integrated into {occupation} lifestyle with connection to {', '.join(interests)}"
         else:
@@ -378,22 +521,25 @@ class ImagePromptBuilder:
 
         Following: Subject + Action + Style + Context
         """
-        subject = structured_prompt['subjects'][0]['description']
-        action = structured_prompt['subjects'][0]['pose']
-        style = structured_prompt['style']
-        context = f"{structured_prompt['background']}, {structured_prompt['lighting']}, {structured_prompt['mood']}"
-
-        simple_prompt = f"{subject}, {action}, {style}, {context}"
-
-        return simple_prompt
+        subject = structured_prompt['subjects'][0]
+
+        # Subject, action, style, then context (background, lighting, mood)
+        return ", ".join((
+            subject['description'],
+            subject['pose'],
+            structured_prompt['style'],
+            structured_prompt['background'],
+            structured_prompt['lighting'],
+            structured_prompt['mood']
+        ))
 
     def get_cached_prompt(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Returns cached structured prompt for a user"""
         return self.prompt_cache.get(user_id)
 
     def get_all_cached_prompts(self) -> Dict[int, Dict[str, Any]]:
-        """Returns all cached structured prompts"""
-        return self.prompt_cache
+        """Returns a snapshot of all cached structured prompts"""
+        return dict(self.prompt_cache)
 
     def format_for_api(self, structured_prompt: Dict[str, Any], format_type: str = "json") -> str:
         """
@@ -409,8 +555,7 @@ class ImagePromptBuilder:
         if format_type == "text":
             return self.convert_to_simple_prompt(structured_prompt)
         else:
-            return json.dumps(structured_prompt, indent=2)
-
+            return orjson.dumps(structured_prompt, option=orjson.OPT_INDENT_2).decode()
 
 # Singleton instance
 image_prompt_builder = ImagePromptBuilder()
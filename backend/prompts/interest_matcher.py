@@ -1,11 +1,28 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
 import logging
 import os
-import json
-from openai import AsyncOpenAI
+import orjson
+from prompts.lru_cache import LRUCache
+from prompts.openai_client import get_openai_client
 
 logger = logging.getLogger(__name__)
 
+# Users per batched matching call; keeps each JSON reply well below the
+# model's output limit (2000 tokens per user, 16k max)
+MATCH_BATCH_SIZE = 8
+
+MATCHING_RULES = """You are an expert at matching user interests with trending topics.
+Your task is to find intelligent matches between user interests and available trend interests.
+
+IMPORTANT RULES:
+1. Match semantically similar interests (e.g., "Marathon Training" matches "Running")
+2. Match broader interests to specific ones (e.g., "Gaming" matches "Video Gaming", "PC Gaming", etc.)
+3. Match related concepts (e.g., "Cooking" matches "Baking", "Meal Prep", "Recipe", etc.)
+4. Return the SPECIFIC trend interest, NOT the general category (e.g., "Football", not "Sports")
+5. Only include confident matches (relevance > 80%)
+6. One user interest can match multiple trend interests if relevant"""
+
 
 class InterestMatcherService:
     """Service for intelligent matching of user interests with trend interests using LLM"""
@@ -13,10 +30,18 @@ class InterestMatcherService:
     def __init__(self):
         self.api_key = os.getenv("OPENAI_API_KEY")
         self.client = None
-        self.match_cache: Dict[str, List[Dict[str, Any]]] = {}
+        # LLM matches by (user interests, trend listing), shared by the
+        # single-user and batched paths
+        self.match_cache: LRUCache = LRUCache(1024)
+        # LLM calls made by the last match_users_with_llm run (batches plus
+        # individual fallbacks); set just before it returns
+        self.last_call_count: int = 0
+        # Formatted trend listing, reused while the trend list stays the same
+        self._trends_text_source: Optional[List[Dict[str, Any]]] = None
+        self._trends_text: str = ""
 
         if self.api_key:
-            self.client = AsyncOpenAI(api_key=self.api_key)
+            self.client = get_openai_client(self.api_key)
             logger.info("Interest Matcher Client initialized")
         else:
             logger.warning(
@@ -44,26 +69,18 @@ class InterestMatcherService:
             logger.warning("No OpenAI client - falling back to exact matching")
             return self._fallback_exact_matching(user_interests, trend_data)
 
+        cache_key = self._match_cache_key(user_interests, trend_data)
+        cached = self.match_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Match cache hit for {user_name}")
+            return cached
+
         try:
             # Build trend information for LLM
-            trends_text = ""
-            for trend in trend_data:
-                category = trend["category"]
-                interests = ", ".join(trend["interests"])
-                trends_text += f"Category: {category}\nInterests: {interests}\n\n"
-
+            trends_text = self._get_trends_text(trend_data)
             user_interests_text = ", ".join(user_interests)
 
-            system_message = """You are an expert at matching user interests with trending topics.
-Your task is to find intelligent matches between user interests and available trend interests.
-
-IMPORTANT RULES:
-1. Match semantically similar interests (e.g., "Marathon Training" matches "Running")
-2. Match broader interests to specific ones (e.g., "Gaming" matches "Video Gaming", "PC Gaming", etc.)
-3. Match related concepts (e.g., "Cooking" matches "Baking", "Meal Prep", "Recipe", etc.)
-4. Return the SPECIFIC trend interest, NOT the general category (e.g., "Football", not "Sports")
-5. Only include confident matches (relevance > 80%)
-6. One user interest can match multiple trend interests if relevant
+            system_message = f"""{MATCHING_RULES}
 
 FORMAT: Return JSON with array of matches, each containing:
 - user_interest: original user interest
@@ -92,37 +109,14 @@ Return ONLY the JSON object, no additional text."""
                 response_format={"type": "json_object"}
             )
 
-            result = json.loads(response.choices[0].message.content)
-            matches = result.get("matches", [])
-
-            # Build structured match results with popularity scores
-            structured_matches = []
-            for match in matches:
-                # Find the original trend to get popularity score
-                matched_category = match.get("category")
-                trend_interest = match.get("matched_trend_interest")
-
-                popularity_score = 80  # Default
-                for trend in trend_data:
-                    if trend["category"] == matched_category:
-                        popularity_score = trend["popularity_score"]
-                        break
-
-                structured_matches.append({
-                    "user_interest": match.get("user_interest"),
-                    "interest": trend_interest,
-                    "trend": trend_interest,
-                    "category": matched_category,
-                    "score": match.get("relevance_score", 85),
-                    "popularity_score": popularity_score,
-                    "reasoning": match.get("reasoning", "")
-                })
+            result = orjson.loads(response.choices[0].message.content)
+            structured_matches = self._structure_matches(
+                result.get("matches", []), trend_data)
 
             logger.info(
                 f"LLM matched {len(structured_matches)} interests for {user_name}")
 
             # Cache results
-            cache_key = f"{user_name}_{hash(tuple(user_interests))}"
             self.match_cache[cache_key] = structured_matches
 
             return structured_matches
@@ -132,6 +126,199 @@ Return ONLY the JSON object, no additional text."""
             logger.warning("Falling back to exact matching")
             return self._fallback_exact_matching(user_interests, trend_data)
 
+    async def match_users_with_llm(
+        self,
+        users_interests: Dict[int, List[str]],
+        trend_data: List[Dict[str, Any]]
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Matches the interests of several users with batched LLM calls.
+        Users are sent in batches of MATCH_BATCH_SIZE (batches run concurrently),
+        so the trend list and instructions are sent once per batch instead of
+        once per user and no reply grows past the token limit.
+        Cached users are not sent again; users missing from a batch reply
+        (error, truncated JSON) are matched individually via match_interests_with_llm.
+
+        Args:
+            users_interests: Dict of user_id -> list of interests and hobbies
+            trend_data: List of trend categories with their interests
+
+        Returns:
+            Dict of user_id -> list of matched interests (same shape as match_interests_with_llm);
+            the number of LLM calls made is stored in last_call_count
+        """
+        self.last_call_count = 0
+        if not users_interests:
+            return {}
+
+        if not self.client:
+            logger.warning("No OpenAI client - falling back to exact matching")
+            return {
+                user_id: self._fallback_exact_matching(interests, trend_data)
+                for user_id, interests in users_interests.items()
+            }
+
+        results: Dict[int, List[Dict[str, Any]]] = {}
+        pending: Dict[int, List[str]] = {}
+        for user_id, interests in users_interests.items():
+            cached = self.match_cache.get(
+                self._match_cache_key(interests, trend_data))
+            if cached is not None:
+                results[user_id] = cached
+            else:
+                pending[user_id] = interests
+
+        pending_ids = list(pending)
+        batches = [
+            {user_id: pending[user_id]
+             for user_id in pending_ids[i:i + MATCH_BATCH_SIZE]}
+            for i in range(0, len(pending_ids), MATCH_BATCH_SIZE)
+        ]
+        for batch_results in await asyncio.gather(
+                *(self._match_batch_with_llm(batch, trend_data) for batch in batches)):
+            results.update(batch_results)
+
+        logger.info(
+            f"LLM matched interests for {len(results)}/{len(users_interests)} users "
+            f"({len(batches)} batched calls, {len(users_interests) - len(pending)} cached)")
+
+        # Users the batch replies did not cover get their own call
+        missing = [user_id for user_id in pending if user_id not in results]
+        single_calls = 0
+        if missing:
+            # Only users without a cached match cause an LLM call
+            single_calls = sum(
+                1 for user_id in missing
+                if self._match_cache_key(pending[user_id], trend_data) not in self.match_cache)
+            logger.warning(
+                f"Batched matching returned no result for {len(missing)} users - matching them individually")
+            single_results = await asyncio.gather(*(
+                self.match_interests_with_llm(
+                    pending[user_id], trend_data, f"User {user_id}")
+                for user_id in missing
+            ))
+            results.update(zip(missing, single_results))
+
+        self.last_call_count = len(batches) + single_calls
+        return {user_id: results[user_id] for user_id in users_interests}
+
+    async def _match_batch_with_llm(
+        self,
+        users_interests: Dict[int, List[str]],
+        trend_data: List[Dict[str, Any]]
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """Matches one batch of users in a single LLM call; users missing from the reply are left out"""
+        results: Dict[int, List[Dict[str, Any]]] = {}
+
+        try:
+            trends_text = self._get_trends_text(trend_data)
+            users_text = "\n".join(
+                f"User {user_id}: {', '.join(interests)}"
+                for user_id, interests in users_interests.items()
+            )
+
+            system_message = f"""{MATCHING_RULES}
+
+FORMAT: Return JSON with an array "users", one entry per user, each containing:
+- user_id: the user ID exactly as given
+- matches: array of matches, each containing:
+  - user_interest: original user interest
+  - matched_trend_interest: specific trend interest name
+  - category: trend category
+  - relevance_score: 0-100 (how confident the match is)
+  - reasoning: brief explanation why they match"""
+
+            user_message = f"""User Interests:
+{users_text}
+
+Available Trends:
+{trends_text}
+
+Find all relevant matches between each user's interests and the trend interests.
+Return ONLY the JSON object, no additional text."""
+
+            response = await self.client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": user_message}
+                ],
+                max_tokens=2000 * len(users_interests),
+                temperature=0.3,
+                response_format={"type": "json_object"}
+            )
+
+            result = orjson.loads(response.choices[0].message.content)
+            for entry in result.get("users", []):
+                try:
+                    user_id = int(entry.get("user_id"))
+                except (TypeError, ValueError):
+                    continue
+                if user_id in users_interests:
+                    structured_matches = self._structure_matches(
+                        entry.get("matches", []), trend_data)
+                    results[user_id] = structured_matches
+                    self.match_cache[self._match_cache_key(
+                        users_interests[user_id], trend_data)] = structured_matches
+
+        except Exception as e:
+            logger.error(f"Error in batched LLM interest matching: {str(e)}")
+
+        return results
+
+    def _match_cache_key(
+        self,
+        user_interests: List[str],
+        trend_data: List[Dict[str, Any]]
+    ) -> Tuple[Tuple[str, ...], str]:
+        """Cache key for LLM matches: the interests and the trend listing they were matched against"""
+        return tuple(user_interests), self._get_trends_text(trend_data)
+
+    def _structure_matches(
+        self,
+        matches: List[Dict[str, Any]],
+        trend_data: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Builds structured match results with popularity scores from raw LLM matches"""
+        structured_matches = []
+        for match in matches:
+            # Find the original trend to get popularity score
+            matched_category = match.get("category")
+            trend_interest = match.get("matched_trend_interest")
+
+            popularity_score = 80  # Default
+            for trend in trend_data:
+                if trend["category"] == matched_category:
+                    popularity_score = trend["popularity_score"]
+                    break
+
+            structured_matches.append({
+                "user_interest": match.get("user_interest"),
+                "interest": trend_interest,
+                "trend": trend_interest,
+                "category": matched_category,
+                "score": match.get("relevance_score", 85),
+                "popularity_score": popularity_score,
+                "reasoning": match.get("reasoning", "")
+            })
+
+        return structured_matches
+
+    def _get_trends_text(self, trend_data: List[Dict[str, Any]]) -> str:
+        """
+        Formats the trend list for the LLM prompt.
+        match_all_users passes the same list for every user, so the text
+        is only rebuilt when a different list comes in.
+        """
+        if trend_data is not self._trends_text_source:
+            self._trends_text = "".join(
+                f"Category: {trend['category']}\nInterests: {', '.join(trend['interests'])}\n\n"
+                for trend in trend_data
+            )
+            self._trends_text_source = trend_data
+
+        return self._trends_text
+
     def _fallback_exact_matching(
         self,
         user_interests: List[str],
@@ -0,0 +1,65 @@
+from collections import OrderedDict
+from collections.abc import MutableMapping
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache(MutableMapping):
+    """
+    Mapping with a size bound: evicts the least recently used entry.
+
+    Only get() and assignments count as a use. Subscripting, iteration and
+    copies leave the order untouched, so the cache can be walked like a dict.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            evicted_key, _ = self._data.popitem(last=False)
+            logger.debug("LRU cache full (%s) - evicted %s", self.maxsize, evicted_key)
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def keys(self):
+        return self._data.keys()
+
+    def values(self):
+        return self._data.values()
+
+    def items(self):
+        return self._data.items()
+
+    def copy(self) -> "LRUCache":
+        cache = LRUCache(self.maxsize)
+        cache._data = self._data.copy()
+        return cache
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(maxsize={self.maxsize}, {dict(self._data)!r})"
@@ -0,0 +1,12 @@
+from functools import lru_cache
+from openai import AsyncOpenAI
+
+
+@lru_cache(maxsize=None)
+def get_openai_client(api_key: str) -> AsyncOpenAI:
+    """
+    Returns a shared AsyncOpenAI client for the given API key.
+    All prompt services use the same instance, so they also share one
+    HTTP connection pool instead of opening their own.
+    """
+    return AsyncOpenAI(api_key=api_key)
@@ -1,11 +1,51 @@
 from typing import Dict, Any, List, Optional
 import logging
 import os
-import json
-from openai import AsyncOpenAI
+import orjson
+from prompts.openai_client import get_openai_client
 
 logger = logging.getLogger(__name__)
 
+IMAGE_ANALYSIS_SYSTEM_PROMPT = """You are an expert in analyzing product images for advertising.
+Describe the image following these strict guidelines:
+1. Use quotation marks for any visible text: "The text 'OPEN' appears in red neon letters above the door"
+2. Specify placement: Where text appears relative to other elements
+3. Describe style: "elegant serif typography", "bold industrial lettering", "handwritten script"
+4. Font size: "large headline text", "small body copy", "medium subheading"
+5. Color: Use hex codes for brand text if possible, or precise color names: "The logo text 'ACME' in color #FF5733"
+6. Describe the product's key visual characteristics, perspective, and composition.
+"""
+
+PROMPT_OPTIMIZER_SYSTEM_PROMPT = """You are an expert in crafting DYNAMIC, ACTION-PACKED prompts for FLUX.2 image generation by Black Forest Labs.
+Your task is to create VIVID, DRAMATIC advertising scenarios that put the product IN MOTION and IN UNEXPECTED SITUATIONS.
+
+🎬 CRITICAL RULES for DYNAMIC PRODUCT SCENARIOS:
+1. The product image is PROVIDED as reference - BUT now show it IN ACTION, IN MOTION, BEING USED
+2. Create SPECIFIC, CONCRETE scenarios (NOT abstract atmospheres): "speeding through narrow Italian coastal roads", "flying off a sand dune jump in Dubai desert"
+3. Match HYPER-SPECIFIC user niches: If user likes "Beach Volleyball", show beach volleyball court in Rio. If "Cristiano Ronaldo" (generalize to "professional footballer"), show football stadium action.
+4. Keep prompts 100-150 words for DETAILED action scenarios
+5. Use CINEMATIC, DYNAMIC language: "racing", "soaring", "splashing", "cutting through", "launching from"
+6. Product should be THE HERO in an EXCITING, UNEXPECTED SITUATION
+7. Format: Dynamic Action → Specific Location/Niche → Dramatic Details → Cinematic Lighting → Energy/Movement
+8. BE BOLD AND CREATIVE: Car driving through a kitchen? Smartphone surfing on ocean wave? GO FOR IT!
+9. IMPORTANT: Match the EXACT specific interest, not the generic category
+
+⚠️ LEGAL COMPLIANCE - COPYRIGHT & TRADEMARK PROTECTION:
+10. NEVER use specific brand names, trademarks, or company names (e.g., "Nike" → "athletic footwear", "Apple" → "smartphone", "Mercedes" → "luxury car")
+11. NEVER use real person names, celebrities, or public figures (e.g., "Cristiano Ronaldo" → "professional football stadium", "Taylor Swift" → "pop music concert stage")
+12. NEVER reference copyrighted characters, franchises, or IP (e.g., "Mario" → "retro video game arcade", "Star Wars" → "sci-fi space battle")
+13. Use SPECIFIC LOCATIONS/SCENARIOS instead: "Champions League stadium", "Miami beach volleyball court", "Alpine ski resort", "Tokyo gaming arcade"
+14. For sports: Use specific venues/scenarios ("Olympic swimming pool", "Wimbledon-style grass court") instead of athlete names
+15. For brands: Use specific use-cases ("luxury sports car racing circuit", "premium tech startup office") instead of brand names
+
+🎯 SCENARIO EXAMPLES:
+- Car interest → "Racing through the winding roads of Swiss Alps, hairpin turns, dramatic mountain backdrop, motion blur, golden hour lighting"
+- Beach Holiday → "Launching off a sand dune on a pristine Maldives beach, turquoise water splashing, palm trees swaying, dynamic mid-air shot"
+- Gaming → "Inside a neon-lit Tokyo gaming arcade, RGB lights reflecting, surrounded by excited gamers, high-energy atmosphere"
+- Running → "Sprinting through iconic marathon finish line in Berlin, crowd cheering, confetti in air, action-packed victory moment"
+
+The reference image contains the product. Show it in a SPECIFIC, DRAMATIC, ACTION-PACKED scenario that matches the user's EXACT niche interest."""
+
 
 class OpenAIService:
     """Service for optimizing image generation prompts using LLM intelligence"""
@@ -16,7 +56,7 @@ class OpenAIService:
         self.optimized_prompts: Dict[int, str] = {}
 
         if self.api_key:
-            self.client = AsyncOpenAI(api_key=self.api_key)
+            self.client = get_openai_client(self.api_key)
             logger.info("OpenAI Image Prompt Optimizer initialized")
         else:
             logger.warning(
@@ -44,20 +84,10 @@ class OpenAIService:
                 base64_image = base64.b64encode(
                     image_file.read()).decode('utf-8')
 
-            system_message = """You are an expert in analyzing product images for advertising.
-Describe the image following these strict guidelines:
-1. Use quotation marks for any visible text: "The text 'OPEN' appears in red neon letters above the door"
-2. Specify placement: Where text appears relative to other elements
-3. Describe style: "elegant serif typography", "bold industrial lettering", "handwritten script"
-4. Font size: "large headline text", "small body copy", "medium subheading"
-5. Color: Use hex codes for brand text if possible, or precise color names: "The logo text 'ACME' in color #FF5733"
-6. Describe the product's key visual characteristics, perspective, and composition.
-"""
-
             response = await self.client.chat.completions.create(
                 model="gpt-4o",
                 messages=[
-                    {"role": "system", "content": system_message},
+                    {"role": "system", "content": IMAGE_ANALYSIS_SYSTEM_PROMPT},
                     {"role": "user", "content": [
                         {"type": "text", "text": "Analyze this product image for use in an image generation prompt."},
                         {"type": "image_url", "image_url": {
@@ -110,36 +140,6 @@ Describe the image following these strict guidelines:
             top_interests = [m['interest']
                              for m in matched_interests[:3]] if matched_interests else []
 
-            system_message = """You are an expert in crafting DYNAMIC, ACTION-PACKED prompts for FLUX.2 image generation by Black Forest Labs.
-Your task is to create VIVID, DRAMATIC advertising scenarios that put the product IN MOTION and IN UNEXPECTED SITUATIONS.
-
-🎬 CRITICAL RULES for DYNAMIC PRODUCT SCENARIOS:
-1. The product image is PROVIDED as reference - BUT now show it IN ACTION, IN MOTION, BEING USED
-2. Create SPECIFIC, CONCRETE scenarios (NOT abstract atmospheres): "speeding through narrow Italian coastal roads", "flying off a sand dune jump in Dubai desert"
-3. Match HYPER-SPECIFIC user niches: If user likes "Beach Volleyball", show beach volleyball court in Rio. If "Cristiano Ronaldo" (generalize to "professional footballer"), show football stadium action.
-4. Keep prompts 100-150 words for DETAILED action scenarios
-5. Use CINEMATIC, DYNAMIC language: "racing", "soaring", "splashing", "cutting through", "launching from"
-6. Product should be THE HERO in an EXCITING, UNEXPECTED SITUATION
-7. Format: Dynamic Action → Specific Location/Niche → Dramatic Details → Cinematic Lighting → Energy/Movement
-8. BE BOLD AND CREATIVE: Car driving through a kitchen? Smartphone surfing on ocean wave? GO FOR IT!
-9. IMPORTANT: Match the EXACT specific interest, not the generic category
-
-⚠️ LEGAL COMPLIANCE - COPYRIGHT & TRADEMARK PROTECTION:
-10. NEVER use specific brand names, trademarks, or company names (e.g., "Nike" → "athletic footwear", "Apple" → "smartphone", "Mercedes" → "luxury car")
-11. NEVER use real person names, celebrities, or public figures (e.g., "Cristiano Ronaldo" → "professional football stadium", "Taylor Swift" → "pop music concert stage")
-12. NEVER reference copyrighted characters, franchises, or IP (e.g., "Mario" → "retro video game arcade", "Star Wars" → "sci-fi space battle")
-13. Use SPECIFIC LOCATIONS/SCENARIOS instead: "Champions League stadium", "Miami beach volleyball court", "Alpine ski resort", "Tokyo gaming arcade"
-14. For sports: Use specific venues/scenarios ("Olympic swimming pool", "Wimbledon-style grass court") instead of athlete names
-15. For brands: Use specific use-cases ("luxury sports car racing circuit", "premium tech startup office") instead of brand names
-
-🎯 SCENARIO EXAMPLES:
-- Car interest → "Racing through the winding roads of Swiss Alps, hairpin turns, dramatic mountain backdrop, motion blur, golden hour lighting"
-- Beach Holiday → "Launching off a sand dune on a pristine Maldives beach, turquoise water splashing, palm trees swaying, dynamic mid-air shot"
-- Gaming → "Inside a neon-lit Tokyo gaming arcade, RGB lights reflecting, surrounded by excited gamers, high-energy atmosphere"
-- Running → "Sprinting through iconic marathon finish line in Berlin, crowd cheering, confetti in air, action-packed victory moment"
-
-The reference image contains the product. Show it in a SPECIFIC, DRAMATIC, ACTION-PACKED scenario that matches the user's EXACT niche interest."""
-
             user_message = f"""Create a DYNAMIC, ACTION-PACKED advertising scenario for FLUX.2:
 
 🎯 CONTEXT:
@@ -150,7 +150,7 @@ The reference image contains the product. Show it in a SPECIFIC, DRAMATIC, ACTIO
 - Note: Product image is provided as reference
 
 BASE PROMPT STRUCTURE:
-{json.dumps(base_structured_prompt, indent=2)}
+{orjson.dumps(base_structured_prompt, option=orjson.OPT_INDENT_2).decode()}
 
 🎬 Create a DRAMATIC, SPECIFIC scenario that:
 
@@ -191,7 +191,7 @@ OUTPUT: Only the final optimized prompt text (100-150 words), no explanations or
             response = await self.client.chat.completions.create(
                 model="gpt-4o",  # Better for creative optimization
                 messages=[
-                    {"role": "system", "content": system_message},
+                    {"role": "system", "content": PROMPT_OPTIMIZER_SYSTEM_PROMPT},
                     {"role": "user", "content": user_message}
                 ],
                 max_tokens=300,  # Increased for detailed action scenarios
@@ -253,7 +253,7 @@ OUTPUT: Only the final optimized prompt text (100-150 words), no explanations or
         ]
 
         # Join and clean up
-        final_prompt = ", ".join([p for p in prompt_parts if p and p.strip()])
+        final_prompt = ", ".join(p for p in prompt_parts if p and p.strip())
 
         return final_prompt
 
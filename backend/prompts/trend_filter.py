@@ -1,10 +1,26 @@
 from typing import Dict, Any, List, Optional
 import logging
 import os
-from openai import AsyncOpenAI
+import orjson
+from prompts.openai_client import get_openai_client
 
 logger = logging.getLogger(__name__)
 
+TREND_FILTER_SYSTEM_PROMPT = """You are an expert content moderator for marketing campaigns.
+Your task is to filter out ONLY trends that are clearly inappropriate:
+1. Violence, tragedies, disasters, or negative events
+2. Adult content, gambling, or illegal activities
+3. Highly controversial political or religious topics
+
+Be LENIENT - Keep positive and neutral trends related to:
+- Technology, smartphones, AI, gaming
+- Sports, fitness, healthy lifestyle
+- Entertainment, music, movies, concerts
+- Travel, food, dining experiences
+- Photography, art, creative hobbies
+
+Return only the trend categories and interests that are suitable for a safe, positive marketing campaign."""
+
 
 class TrendFilterService:
     """Service for filtering trends using LLM to ensure campaign suitability"""
@@ -15,7 +31,7 @@ class TrendFilterService:
         self.filtered_trends_cache: Dict[str, List[Dict[str, Any]]] = {}
 
         if self.api_key:
-            self.client = AsyncOpenAI(api_key=self.api_key)
+            self.client = get_openai_client(self.api_key)
             logger.info("Trend Filter Client initialized")
         else:
             logger.warning("OPENAI_API_KEY not set - Trend filtering disabled")
@@ -42,25 +58,10 @@ class TrendFilterService:
 
         try:
             # Prepare trends for analysis
-            trends_text = "\n".join([
+            trends_text = "\n".join(
                 f"- Category: {trend['category']}, Interests: {', '.join(trend['interests'])}, Popularity: {trend['popularity_score']}"
                 for trend in trends
-            ])
-
-            system_message = """You are an expert content moderator for marketing campaigns. 
-            Your task is to filter out ONLY trends that are clearly inappropriate:
-            1. Violence, tragedies, disasters, or negative events
-            2. Adult content, gambling, or illegal activities
-            3. Highly controversial political or religious topics
-            
-            Be LENIENT - Keep positive and neutral trends related to:
-            - Technology, smartphones, AI, gaming
-            - Sports, fitness, healthy lifestyle
-            - Entertainment, music, movies, concerts
-            - Travel, food, dining experiences
-            - Photography, art, creative hobbies
-            
-            Return only the trend categories and interests that are suitable for a safe, positive marketing campaign."""
+            )
 
             user_message = f"""
             Campaign Theme: {campaign_theme}
@@ -76,7 +77,7 @@ class TrendFilterService:
             response = await self.client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
-                    {"role": "system", "content": system_message},
+                    {"role": "system", "content": TREND_FILTER_SYSTEM_PROMPT},
                     {"role": "user", "content": user_message}
                 ],
                 max_tokens=1500,
@@ -84,8 +85,7 @@ class TrendFilterService:
                 response_format={"type": "json_object"}
             )
 
-            import json
-            result = json.loads(response.choices[0].message.content)
+            result = orjson.loads(response.choices[0].message.content)
 
             # Filter trends based on LLM response
             filtered_trends = []
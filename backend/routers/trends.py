@@ -10,7 +10,7 @@ async def get_trends():
     """
     Gibt alle aktuellen Trenddaten zurück
     """
-    trends = trend_service.get_cached_trends()
+    trends = await trend_service.get_loaded_trends()
     
     if "message" in trends:
         raise HTTPException(status_code=404, detail=trends["message"])
@@ -39,6 +39,7 @@ async def get_trends_by_category(category: str):
     """
     Gibt Trends für eine spezifische Kategorie zurück
     """
+    await trend_service.ensure_loaded()
     trends = trend_service.get_trends_by_category(category)
     
     if "error" in trends:
@@ -55,6 +56,7 @@ async def get_top_interests(limit: Optional[int] = 5):
     if limit < 1 or limit > 50:
         raise HTTPException(status_code=400, detail="Limit muss zwischen 1 und 50 liegen")
     
+    await trend_service.ensure_loaded()
     top_interests = trend_service.get_top_interests(limit=limit)
     
     if not top_interests:
@@ -2,9 +2,10 @@ from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from typing import List, Optional
 from pydantic import BaseModel
 import logging
-import json
 import shutil
 import asyncio
+import base64
+import io
 import random
 from pathlib import Path
 from datetime import datetime
@@ -14,8 +15,9 @@ from services.trend_matcher import trend_matcher
 from services.trend_analysis import trend_service
 from prompts.openai_service import openai_service
 from prompts.trend_filter import trend_filter_service
+from prompts.interest_matcher import interest_matcher_service
 from prompts.image_prompt_builder import image_prompt_builder
-from prompts.image_generation import image_service
+from prompts.image_generation import image_service, STATUS_GENERATED
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -34,6 +36,12 @@ class CampaignRequest(BaseModel):
     campaign_theme: Optional[str] = "general marketing campaign"
 
 
+def _write_upload_to_disk(upload_file: UploadFile, file_path: Path) -> None:
+    """Copies the uploaded file to disk (blocking, run in a worker thread)"""
+    with file_path.open("wb") as buffer:
+        shutil.copyfileobj(upload_file.file, buffer)
+
+
 async def save_uploaded_image(upload_file: UploadFile) -> str:
     """Saves uploaded product image temporarily"""
     upload_dir = Path("uploads")
@@ -44,8 +52,8 @@ async def save_uploaded_image(upload_file: UploadFile) -> str:
     file_path = upload_dir / f"product_{timestamp}{file_extension}"
 
     try:
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(upload_file.file, buffer)
+        # Disk I/O runs off the event loop so other requests are not blocked
+        await asyncio.to_thread(_write_upload_to_disk, upload_file, file_path)
         logger.info(f"Product image saved: {file_path}")
         return str(file_path)
     except Exception as e:
@@ -222,9 +230,7 @@ async def generate_campaign(
 
     # STEP 1: Save uploaded product image and convert to base64 for Black Forest API
     try:
-        import base64
         from PIL import Image
-        import io
 
         image_path = await save_uploaded_image(product_image)
         logger.info(f" Step 1 Complete: Image saved to {image_path}")
@@ -263,8 +269,8 @@ async def generate_campaign(
         logger.error(f"Step 1 Failed: {str(e)}")
         raise
 
-    # STEP 2: Get hardcoded trends
-    trends_data = trend_service.get_cached_trends()
+    # STEP 2: Get hardcoded trends (waits for the startup load if it is still running)
+    trends_data = await trend_service.get_loaded_trends()
     if "message" in trends_data or "error" in trends_data:
         logger.error("Step 2 Failed: No trend data available")
         raise HTTPException(status_code=404, detail="No trend data available")
@@ -316,6 +322,7 @@ async def generate_campaign(
     }
 
     match_results = await trend_matcher.match_all_users()
+    matching_calls = interest_matcher_service.last_call_count
 
     # Restore original trends
     trend_service.trends_data = original_trends
@@ -362,8 +369,9 @@ async def generate_campaign(
 
     # Count API calls from previous steps
     api_calls["openai_gpt4o_mini"] += 1  # Step 3: Trend filtering
-    # Step 4: Interest matching (1 per user)
-    api_calls["openai_gpt4o_mini"] += len(match_results)
+    # Step 4: Interest matching (batched calls plus individual fallbacks,
+    # none for cached users)
+    api_calls["openai_gpt4o_mini"] += matching_calls
 
     # PREPARE STEP 9 (Preview User Selection) - Moved up for parallelization
     random_user_match = None
@@ -418,6 +426,7 @@ async def generate_campaign(
 
     # Prepare data for parallel OpenAI prompt optimization
     trend_data_for_optimization = []
+    prompt_requests = []
     for trend in selected_trends:
         trend_category = trend["category"]
         trend_interests = trend["interests"]
@@ -435,18 +444,19 @@ async def generate_campaign(
         relevant_interests = list(user_specific_interests)[
             :1] if user_specific_interests else trend_interests[:1]
 
-        structured_prompt = image_prompt_builder.build_prompt_for_trend(
-            product_description=product_description,
-            trend_category=trend_category,
-            trend_interests=relevant_interests
-        )
-
+        prompt_requests.append(
+            (product_description, trend_category, relevant_interests, None))
         trend_data_for_optimization.append({
             "category": trend_category,
-            "structured_prompt": structured_prompt,
             "relevant_interests": relevant_interests
         })
 
+    # Build all trend prompts in one batch (skeletons shared per category/interest)
+    for data, structured_prompt in zip(
+            trend_data_for_optimization,
+            image_prompt_builder.build_prompts_for_trends(prompt_requests)):
+        data["structured_prompt"] = structured_prompt
+
     # Parallelize OpenAI prompt optimization for all trends AND preview user
     logger.info(
         f"    Optimizing {len(trend_data_for_optimization)} trend prompts + 1 user prompt in parallel with GPT-4o...")
@@ -471,7 +481,6 @@ async def generate_campaign(
         optimization_tasks.append(user_optimized_prompt_task)
 
     # Execute all optimizations in parallel
-    import asyncio
     all_optimized_results = await asyncio.gather(*optimization_tasks, return_exceptions=True)
 
     # Separate results
@@ -554,12 +563,25 @@ async def generate_campaign(
         trend_images = {}
     else:
         trend_images = trend_images_result
-        
-    # Count actual images generated
-    api_calls["black_forest"] += len(trend_images)
 
+    # Only successful generations are counted and cached; failed attempts
+    # (failed, moderated, timeout, error, no_key) are reported separately
+    failed_trend_images = {}
+    generated_trend_count = 0
     for trend_category, image_data in trend_images.items():
-        image_service.cache_trend_image(trend_category, image_data)
+        if image_data.get("status") == STATUS_GENERATED:
+            generated_trend_count += 1
+            image_service.cache_trend_image(trend_category, image_data)
+        else:
+            failed_trend_images[trend_category] = {
+                "status": image_data.get("status"),
+                "error": image_data.get("error")
+            }
+
+    # Count actual images generated
+    api_calls["black_forest"] += generated_trend_count
+    if failed_trend_images:
+        logger.warning(f"     Trend image generation failed for: {failed_trend_images}")
 
     # Process Preview Images Results
     preview_formats = {}
@@ -580,10 +602,10 @@ async def generate_campaign(
                 "rectangular": rect_res
             }
             
-            # Count preview images
-            if banner_res: api_calls["black_forest"] += 1
-            if vertical_res: api_calls["black_forest"] += 1
-            if rect_res: api_calls["black_forest"] += 1
+            # Count preview images (only successful generations)
+            for preview_res in (banner_res, vertical_res, rect_res):
+                if preview_res and preview_res.get("status") == STATUS_GENERATED:
+                    api_calls["black_forest"] += 1
             
             logger.info(f" Step 9 Complete: Generated preview formats for {random_user_data.get('name')}")
 
@@ -608,7 +630,7 @@ async def generate_campaign(
                     "trend_category": category,
                     "image_url": trend_image.get("image_url"),
                     "prompt_used": trend_image.get("prompt_used"),
-                    "status": "generated"
+                    "status": trend_image.get("status", "generated")
                 })
 
         if not user_images:
@@ -656,7 +678,8 @@ async def generate_campaign(
         "filtered_trends_count": len(filtered_trends),
         "selected_trends_count": len(selected_trends),
         "selected_trends": [{"category": t["category"], "interests": t["interests"], "user_matches": trend_user_counts.get(t["category"], 0)} for t in selected_trends],
-        "trend_images_generated": len(trend_images),
+        "trend_images_generated": generated_trend_count,
+        "failed_trend_images": failed_trend_images,
         "users_targeted": len(campaign_results),
         "total_user_images_mapped": total_images_generated,
         "preview_formats": preview_formats,
@@ -1,7 +1,9 @@
 from typing import List, Dict, Any
 from datetime import datetime
+from contextlib import suppress
+import asyncio
 import logging
-import json
+import orjson
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -15,12 +17,30 @@ class TrendAnalysisService:
         self.last_update: datetime | None = None
         self.trends_file = Path(__file__).parent.parent / \
             "data" / "trends_short.json"
+        # Letzter Dateiinhalt samt mtime, um unveränderte Dateien nicht neu zu parsen
+        self._trends_file_mtime: int | None = None
+        self._trends_file_data: Dict[str, Any] = {}
+        # Nach Score sortierte Interessen, gültig solange trends_data dasselbe Objekt ist
+        self._sorted_interests_source: Dict[str, Any] | None = None
+        self._sorted_interests: List[Dict[str, Any]] = []
+        # Antwort-Snapshot und Kategorie-Index, ebenfalls an trends_data gebunden
+        self._snapshot_source: Dict[str, Any] | None = None
+        self._snapshot: Dict[str, Any] = {}
+        self._categories_source: Dict[str, Any] | None = None
+        self._categories: Dict[str, Dict[str, Any]] = {}
+        self._refresh_task: asyncio.Task | None = None
 
     def _load_trends_from_file(self) -> Dict[str, Any]:
         """Lädt Trend-Daten aus der trends.json Datei"""
         try:
-            with open(self.trends_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            mtime = self.trends_file.stat().st_mtime_ns
+            if mtime != self._trends_file_mtime:
+                with open(self.trends_file, 'rb') as f:
+                    data = orjson.loads(f.read())
+                self._trends_file_data = data
+                self._trends_file_mtime = mtime
+            else:
+                data = self._trends_file_data
 
             return {
                 "trends": data.get("trends", []),
@@ -31,7 +51,7 @@ class TrendAnalysisService:
         except FileNotFoundError:
             logger.error(f"Trends file not found: {self.trends_file}")
             return {"error": "Trends file not found"}
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Error parsing trends.json: {str(e)}")
             return {"error": "Invalid JSON format"}
 
@@ -57,24 +77,65 @@ class TrendAnalysisService:
             logger.error(f"Fehler beim Abrufen der Trendanalyse: {str(e)}")
             return {"error": str(e)}
 
+    def start_background_refresh(self) -> asyncio.Task:
+        """
+        Startet fetch_user_interests als Hintergrund-Task, ohne darauf zu warten.
+        So blockiert das Laden der Trends nicht den Start der API.
+        """
+        self._refresh_task = asyncio.create_task(self.fetch_user_interests())
+        return self._refresh_task
+
+    async def ensure_loaded(self) -> None:
+        """Wartet auf den laufenden Hintergrund-Refresh, solange noch keine Trenddaten vorliegen"""
+        task = self._refresh_task
+        if not self.trends_data and task is not None and not task.done():
+            # shield: ein abgebrochener Request soll den gemeinsamen Task nicht abbrechen
+            await asyncio.shield(task)
+
+    async def stop_background_refresh(self) -> None:
+        """Bricht einen noch laufenden Hintergrund-Refresh ab (beim Shutdown)"""
+        task = self._refresh_task
+        if task is not None and not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        self._refresh_task = None
+
     def get_cached_trends(self) -> Dict[str, Any]:
         """Gibt die zuletzt abgerufenen Trends zurück"""
         if not self.trends_data:
             return {"message": "Keine Trenddaten verfügbar. Bitte initialisieren."}
 
-        return {
-            **self.trends_data,
-            "last_update": self.last_update.isoformat() if self.last_update else None
-        }
+        # Snapshot nur nach einer Aktualisierung neu aufbauen
+        if self.trends_data is not self._snapshot_source:
+            self._snapshot = {
+                **self.trends_data,
+                "last_update": self.last_update.isoformat() if self.last_update else None
+            }
+            self._snapshot_source = self.trends_data
+
+        return self._snapshot
+
+    async def get_loaded_trends(self) -> Dict[str, Any]:
+        """Wie get_cached_trends, wartet aber vorher auf einen noch laufenden Start-Load"""
+        await self.ensure_loaded()
+        return self.get_cached_trends()
 
     def get_trends_by_category(self, category: str) -> Dict[str, Any]:
         """Gibt Trends für eine spezifische Kategorie zurück"""
         if not self.trends_data or "trends" not in self.trends_data:
             return {"error": "Keine Trenddaten verfügbar"}
 
-        for trend in self.trends_data["trends"]:
-            if trend["category"].lower() == category.lower():
-                return trend
+        if self.trends_data is not self._categories_source:
+            self._categories = {}
+            for trend in self.trends_data["trends"]:
+                # Bei doppelten Kategorien gewinnt wie bisher der erste Eintrag
+                self._categories.setdefault(trend["category"].lower(), trend)
+            self._categories_source = self.trends_data
+
+        trend = self._categories.get(category.lower())
+        if trend is not None:
+            return trend
 
         return {"error": f"Kategorie '{category}' nicht gefunden"}
 
@@ -83,19 +144,25 @@ class TrendAnalysisService:
         if not self.trends_data or "trends" not in self.trends_data:
             return []
 
-        all_interests = []
-        for trend in self.trends_data["trends"]:
-            for interest in trend["interests"]:
-                all_interests.append({
+        # trends_data wird bei jeder Aktualisierung neu zugewiesen,
+        # daher reicht ein Identitätsvergleich zur Invalidierung
+        if self.trends_data is not self._sorted_interests_source:
+            all_interests = [
+                {
                     "interest": interest,
                     "category": trend["category"],
                     "score": trend["popularity_score"]
-                })
+                }
+                for trend in self.trends_data["trends"]
+                for interest in trend["interests"]
+            ]
+
+            # Sortiere nach Popularity Score
+            self._sorted_interests = sorted(
+                all_interests, key=lambda x: x["score"], reverse=True)
+            self._sorted_interests_source = self.trends_data
 
-        # Sortiere nach Popularity Score
-        sorted_interests = sorted(
-            all_interests, key=lambda x: x["score"], reverse=True)
-        return sorted_interests[:limit]
+        return self._sorted_interests[:limit]
 
 
 # Singleton-Instanz
@@ -1,6 +1,5 @@
 from typing import List, Dict, Any
 import logging
-import asyncio
 from services.trend_analysis import trend_service
 from services.user_data import user_service
 from prompts.interest_matcher import interest_matcher_service
@@ -24,11 +23,10 @@ class TrendMatcher:
             return {"error": f"User mit ID {user_id} nicht gefunden"}
 
         # Hole alle User-Interessen (interests + hobbies)
-        user_interests_list = list(
-            set(user.get("interests", []) + user.get("hobbies", [])))
+        user_interests_list = self._get_user_interests(user)
 
         # Hole aktuelle Trends
-        trends_data = trend_service.get_cached_trends()
+        trends_data = await trend_service.get_loaded_trends()
         if "message" in trends_data or "error" in trends_data:
             return {"error": "Keine Trenddaten verfügbar"}
 
@@ -39,6 +37,46 @@ class TrendMatcher:
             user_name=user["name"]
         )
 
+        return self._build_match_result(user, user_interests_list, matches)
+
+    async def match_all_users(self) -> List[Dict[str, Any]]:
+        """Führt Trend-Matching für alle User mit gebündelten LLM-Aufrufen durch"""
+        users = user_service.get_all_users()
+
+        trends_data = await trend_service.get_loaded_trends()
+        if "message" in trends_data or "error" in trends_data:
+            return [{"error": "Keine Trenddaten verfügbar"} for _ in users]
+
+        interests_by_user = {
+            user["id"]: self._get_user_interests(user) for user in users}
+
+        # Batch-Aufrufe statt eines LLM-Aufrufs pro User
+        matches_by_user = await interest_matcher_service.match_users_with_llm(
+            users_interests=interests_by_user,
+            trend_data=trends_data.get("trends", [])
+        )
+
+        results = [
+            self._build_match_result(
+                user, interests_by_user[user["id"]], matches_by_user.get(user["id"], []))
+            for user in users
+        ]
+
+        logger.info(f"Trend-Matching für {len(users)} User abgeschlossen")
+        return results
+
+    def _get_user_interests(self, user: Dict[str, Any]) -> List[str]:
+        """Gibt alle Interessen eines Users zurück (interests + hobbies, ohne Duplikate)"""
+        return list(set(user.get("interests", []) + user.get("hobbies", [])))
+
+    def _build_match_result(
+        self,
+        user: Dict[str, Any],
+        user_interests_list: List[str],
+        matches: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Baut das Match-Ergebnis eines Users und legt es im Cache ab"""
+        user_id = user["id"]
         result = {
             "user_id": user_id,
             "user_name": user["name"],
@@ -55,17 +93,6 @@ class TrendMatcher:
             f"User {user['name']} (ID: {user_id}): {len(matches)} Trend-Matches gefunden")
         return result
 
-    async def match_all_users(self) -> List[Dict[str, Any]]:
-        """Führt Trend-Matching für alle User durch"""
-        users = user_service.get_all_users()
-
-        # Run async matching for all users in parallel
-        tasks = [self.match_user_with_trends(user["id"]) for user in users]
-        results = await asyncio.gather(*tasks)
-
-        logger.info(f"Trend-Matching für {len(users)} User abgeschlossen")
-        return results
-
     def get_cached_match(self, user_id: int) -> Dict[str, Any]:
         """Gibt gecachtes Match-Ergebnis zurück"""
         if user_id not in self.user_trend_matches:
@@ -1,6 +1,7 @@
 from typing import List, Dict, Any, Optional
-import json
 import logging
+import os
+import orjson
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -21,8 +22,8 @@ class UserDataService:
                 logger.warning(f"User-Datei nicht gefunden: {self.data_file}")
                 return []
             
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                self.users = json.load(f)
+            with open(self.data_file, 'rb') as f:
+                self.users = orjson.loads(f.read())
             
             logger.info(f"{len(self.users)} User erfolgreich geladen")
             return self.users
@@ -54,8 +55,12 @@ class UserDataService:
         try:
             self.data_file.parent.mkdir(parents=True, exist_ok=True)
             
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.users, f, ensure_ascii=False, indent=2)
+            # In temporäre Datei schreiben und atomar ersetzen,
+            # damit nie eine halb geschriebene users.json entsteht
+            tmp_file = self.data_file.with_name(self.data_file.name + ".tmp")
+            with open(tmp_file, 'wb') as f:
+                f.write(orjson.dumps(self.users, option=orjson.OPT_INDENT_2))
+            os.replace(tmp_file, self.data_file)
             
             logger.info("User-Daten erfolgreich gespeichert")
             return True